@@ -0,0 +1,71 @@
+"""Time and memory used by the exact Hog computations at large goals.
+
+Run from the DicingGame! directory:
+
+    python3 -m benchmarks.large_goals --goals 100 1000 10000
+
+Each goal is measured in a fresh process, so that the peak resident set size
+it reports belongs to that goal alone and no cached solution is reused.
+"""
+
+import multiprocessing
+import resource
+import sys
+import time
+
+from ucb import main
+
+DEFAULT_GOALS = (100, 1000, 3000, 10000)
+
+
+def measure(goal):
+    """Return a dictionary of the seconds taken to solve the game to GOAL and
+    to compare the optimal strategy against itself, and of the peak resident
+    set size of the process in megabytes.
+
+    >>> result = measure(100)
+    >>> sorted(result)
+    ['compare_seconds', 'goal', 'peak_rss_mb', 'solve_seconds', 'win_rate']
+    >>> round(result['win_rate'], 6)
+    0.516823
+    """
+    from hog_exact import compare_strategies, optimal_strategy_table, optimal_win_rate
+
+    start = time.perf_counter()
+    win_rate = optimal_win_rate(goal)
+    table = optimal_strategy_table(goal)
+    solved = time.perf_counter()
+    compare_strategies(table, table, goal)
+    compared = time.perf_counter()
+    return {
+        'goal': goal,
+        'win_rate': win_rate,
+        'solve_seconds': solved - start,
+        'compare_seconds': compared - solved,
+        'peak_rss_mb': peak_rss() / 2 ** 20,
+    }
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+@main
+def run(*args):
+    """Measure each goal in its own process and print one line per goal."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Large-goal Hog benchmark")
+    parser.add_argument('--goals', '-g', type=int, nargs='+', default=DEFAULT_GOALS,
+                        help='Goal scores to measure')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    print('{:>6} {:>10} {:>10} {:>10} {:>10}'.format(
+        'goal', 'win rate', 'solve s', 'compare s', 'peak MB'))
+    for goal in args.goals:
+        with context.Pool(1, maxtasksperchild=1) as pool:
+            result = pool.apply(measure, (goal,))
+        print('{goal:>6} {win_rate:>10.6f} {solve_seconds:>10.2f} '
+              '{compare_seconds:>10.2f} {peak_rss_mb:>10.1f}'.format(**result), flush=True)
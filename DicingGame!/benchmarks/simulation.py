@@ -0,0 +1,243 @@
+"""Throughput of the Hog functions that simulations call most often.
+
+Run from the DicingGame! directory:
+
+    python3 -m benchmarks.simulation --save before.json
+    python3 -m benchmarks.simulation --baseline before.json --tolerance 0.1
+
+Each workload is timed several times from the same seed, so that every run
+rolls the same dice and plays the same games, and the fastest run is
+reported. Results are reported in nanoseconds per call, and for workloads
+that play games, in games and turns per second. Compared with a baseline
+saved by an earlier run, any workload more than TOLERANCE slower per call is
+reported as a regression, and the runner exits with status 1.
+"""
+
+import io
+import json
+import platform
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+
+import hog
+from ucb import main
+
+SEED = 61
+REPEAT = 5  # Timed runs of each workload, of which the fastest is kept
+TOLERANCE = 0.1  # Slowdown per call allowed before a regression is reported
+
+
+class CountedStrategy:
+    """A strategy that counts how many turns it has been asked to play.
+
+    >>> counted = CountedStrategy(hog.always_roll(3))
+    >>> counted(10, 20), counted(30, 20), counted.turns
+    (3, 3, 2)
+    """
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.turns = 0
+
+    def __call__(self, score, opponent_score):
+        self.turns += 1
+        return self.strategy(score, opponent_score)
+
+
+class Workload:
+    """A function RUN of no arguments that makes CALLS calls to the function
+    being measured and plays GAMES games of TURNS turns in total. The turns
+    are counted by COUNT_TURNS, which plays the same games from the same seed
+    outside of the timed runs.
+    """
+
+    def __init__(self, run, calls, games=0, count_turns=None):
+        self.run = run
+        self.calls = calls
+        self.games = games
+        self.count_turns = count_turns
+
+
+def roll_dice_workload(num_rolls=6, calls=10000):
+    def run():
+        for _ in range(calls):
+            hog.roll_dice(num_rolls)
+    return Workload(run, calls)
+
+
+def hefty_hogs_workload(goal=hog.GOAL_SCORE):
+    pairs = [(score, opponent_score) for score in range(goal)
+             for opponent_score in range(goal)]
+
+    def run():
+        for score, opponent_score in pairs:
+            hog.hefty_hogs(score, opponent_score)
+    return Workload(run, len(pairs))
+
+
+def play_workload(games=1000):
+    def play_games(strategy0, strategy1):
+        with redirect_stdout(io.StringIO()):  # Discard what play prints
+            for _ in range(games):
+                hog.play(strategy0, strategy1)
+
+    def count_turns():
+        counted0 = CountedStrategy(hog.hefty_hogs_strategy)
+        counted1 = CountedStrategy(hog.always_roll(6))
+        play_games(counted0, counted1)
+        return counted0.turns + counted1.turns
+    return Workload(lambda: play_games(hog.hefty_hogs_strategy, hog.always_roll(6)),
+                    games, games, count_turns)
+
+
+def make_averaged_workload(total_samples=10000):
+    averaged_dice = hog.make_averaged(hog.roll_dice, total_samples)
+    return Workload(lambda: averaged_dice(6), total_samples)
+
+
+def average_win_rate_workload():
+    games = 2000  # make_averaged plays 1000 games in each seat.
+
+    def count_turns():
+        strategy = CountedStrategy(hog.hefty_hogs_strategy)
+        baseline = CountedStrategy(hog.always_roll(6))
+        averaged_winner = hog.make_averaged(hog.winner)
+        averaged_winner(strategy, baseline)
+        averaged_winner(baseline, strategy)
+        return strategy.turns + baseline.turns
+    return Workload(lambda: hog.average_win_rate(hog.hefty_hogs_strategy),
+                    1, games, count_turns)
+
+
+WORKLOADS = {
+    'roll_dice': roll_dice_workload,
+    'hefty_hogs': hefty_hogs_workload,
+    'play': play_workload,
+    'make_averaged': make_averaged_workload,
+    'average_win_rate': average_win_rate_workload,
+}
+
+
+def measure(name, seed=SEED, repeat=REPEAT):
+    """Return a dictionary of the throughput of the workload NAME, timed
+    REPEAT times from SEED.
+
+    >>> result = measure('play', repeat=1)
+    >>> sorted(result)
+    ['calls', 'games', 'games_per_second', 'ns_per_call', 'seconds', 'turns', 'turns_per_second']
+    >>> result['games'], result['turns'] == measure('play', repeat=1)['turns']
+    (1000, True)
+    >>> measure('roll_dice', repeat=1)['turns_per_second'] is None
+    True
+    """
+    workload = WORKLOADS[name]()
+    turns = None
+    if workload.count_turns:
+        random.seed(seed)
+        turns = workload.count_turns()
+    best = float('inf')
+    for _ in range(repeat):
+        random.seed(seed)
+        start = time.perf_counter()
+        workload.run()
+        best = min(best, time.perf_counter() - start)
+    return {
+        'calls': workload.calls,
+        'games': workload.games,
+        'turns': turns,
+        'seconds': best,
+        'ns_per_call': best / workload.calls * 1e9,
+        'games_per_second': workload.games / best if workload.games else None,
+        'turns_per_second': turns / best if turns else None,
+    }
+
+
+def measure_all(names=None, seed=SEED, repeat=REPEAT):
+    """Return the results of measuring each workload in NAMES (by default,
+    all of them), along with the seed and the version of Python used."""
+    names = names or list(WORKLOADS)
+    return {
+        'seed': seed,
+        'repeat': repeat,
+        'python': platform.python_version(),
+        'results': {name: measure(name, seed, repeat) for name in names},
+    }
+
+
+def regressions(results, baseline, tolerance=TOLERANCE):
+    """Return a dictionary of the ratio of the time per call in RESULTS to
+    the time per call in BASELINE, for each workload more than TOLERANCE
+    slower than in BASELINE. Workloads missing from either are ignored.
+
+    >>> baseline = {'results': {'play': {'ns_per_call': 100.0},
+    ...                         'hefty_hogs': {'ns_per_call': 100.0}}}
+    >>> results = {'results': {'play': {'ns_per_call': 125.0},
+    ...                        'hefty_hogs': {'ns_per_call': 105.0},
+    ...                        'roll_dice': {'ns_per_call': 1000.0}}}
+    >>> regressions(results, baseline)
+    {'play': 1.25}
+    >>> regressions(results, baseline, tolerance=0.3)
+    {}
+    """
+    slower = {}
+    for name, result in results['results'].items():
+        if name in baseline['results']:
+            ratio = result['ns_per_call'] / baseline['results'][name]['ns_per_call']
+            if ratio > 1 + tolerance:
+                slower[name] = ratio
+    return slower
+
+
+def report(results, baseline=None):
+    """Return a printable table of RESULTS, with the ratio of each time per
+    call to the time per call in BASELINE, if one is given."""
+    def rate(value):
+        return '{:>14,.0f}'.format(value) if value else '{:>14}'.format('-')
+
+    lines = ['{:<18} {:>14} {:>14} {:>14}'.format(
+        'workload', 'ns/call', 'games/s', 'turns/s') + ('  vs baseline' if baseline else '')]
+    for name, result in results['results'].items():
+        line = '{:<18} {:>14,.1f}'.format(name, result['ns_per_call'])
+        line += ' ' + rate(result['games_per_second']) + ' ' + rate(result['turns_per_second'])
+        if baseline and name in baseline['results']:
+            ratio = result['ns_per_call'] / baseline['results'][name]['ns_per_call']
+            line += '  {:>10.2f}x'.format(ratio)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+@main
+def run(*args):
+    """Measure the workloads, print their throughput, and compare it with a
+    saved baseline."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Hog simulation benchmarks")
+    parser.add_argument('--only', '-o', nargs='+', choices=list(WORKLOADS),
+                        help='Workloads to measure (by default, all of them)')
+    parser.add_argument('--seed', '-s', type=int, default=SEED,
+                        help='Seed for the random module before each run')
+    parser.add_argument('--repeat', '-r', type=int, default=REPEAT,
+                        help='Timed runs of each workload')
+    parser.add_argument('--save', help='File to save the results to as JSON')
+    parser.add_argument('--baseline', '-b', help='JSON results to compare with')
+    parser.add_argument('--tolerance', '-t', type=float, default=TOLERANCE,
+                        help='Slowdown per call allowed, as a fraction of the baseline')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    results = measure_all(args.only, args.seed, args.repeat)
+    print(report(results, baseline))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        slower = regressions(results, baseline, args.tolerance)
+        for name, ratio in slower.items():
+            print('Regression: {} is {:.2f}x slower than the baseline'.format(name, ratio))
+        if slower:
+            sys.exit(1)
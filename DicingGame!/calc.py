@@ -21,6 +21,33 @@ def export(strategy):
 
 
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Compare two Hog strategies")
+    parser.add_argument('--local', '-l', action='store_true',
+                        help='Compute the exact win rate locally instead of '
+                             'asking the hog-calc server')
+    parser.add_argument('--server', '-s',
+                        help='URL of a hog_calc_server.py to ask instead of '
+                             'the hog-calc server')
+    args = parser.parse_args()
+
+    if args.local:
+        from hog_exact import compare_strategies
+        win_rate = compare_strategies(export(STRATEGY_0), export(STRATEGY_1))
+        print("Win rate: {}".format(win_rate))
+        return
+
+    if args.server:
+        data = {"strat0": export(STRATEGY_0), "strat1": export(STRATEGY_1)}
+        request = Request(args.server.rstrip("/") + "/api/compare_strategies",
+                          bytes(json.dumps(data), "utf-8"), method="POST")
+        body = json.loads(urlopen(request).read().decode())
+        if body["success"]:
+            print("Win rate: {}".format(body["win_rate"]))
+        else:
+            raise Exception(body["message"])
+        return
+
     token = OAuthSession().auth()
     data = {
         "strat0": json.dumps(export(STRATEGY_0)),
@@ -12,9 +12,52 @@ Types of dice:
  -  A test dice is deterministic: it always cycles through a fixed
    sequence of values that are passed as arguments.
    Test dice are generated by the make_test_dice function.
+
+Fair dice also record their number of sides in a SIDES attribute, so that
+code computing exact probabilities (see hog_exact.py) can recognize them, and
+have a ROLLS attribute: DICE.rolls(K) returns a list of K outcomes at once,
+drawn with a single call to the random number generator (see batch_rolls).
 """
 
-from random import randint
+from random import Random, getrandbits, randint, randrange
+
+
+def batch_rolls(sides, getrandbits, randrange):
+    """Return a function that takes K and returns a list of K outcomes of a
+    fair die with SIDES sides.
+
+    All K outcomes come from one random number: K groups of bits from
+    GETRANDBITS if SIDES is a power of two, and otherwise the K base-SIDES
+    digits of a number drawn by RANDRANGE below SIDES ** K. Either way, each
+    outcome is exactly uniform without being drawn again.
+
+    >>> rng = Random(61)
+    >>> rolls4, rolls6 = batch_rolls(4, rng.getrandbits, rng.randrange), batch_rolls(6, rng.getrandbits, rng.randrange)
+    >>> outcomes4 = [x for _ in range(6000) for x in rolls4(10)]
+    >>> outcomes6 = [x for _ in range(6000) for x in rolls6(10)]
+    >>> sorted(set(outcomes4)), sorted(set(outcomes6))
+    ([1, 2, 3, 4], [1, 2, 3, 4, 5, 6])
+    >>> all(abs(outcomes4.count(k) / 60000 - 1 / 4) < 0.01 for k in range(1, 5))
+    True
+    >>> all(abs(outcomes6.count(k) / 60000 - 1 / 6) < 0.01 for k in range(1, 7))
+    True
+    """
+    bits = sides.bit_length() - 1
+    if sides == 1 << bits:
+        mask = sides - 1
+
+        def rolls(k):
+            value = getrandbits(bits * k)
+            return [((value >> (bits * i)) & mask) + 1 for i in range(k)]
+    else:
+        def rolls(k):
+            value = randrange(sides ** k)
+            outcomes = []
+            for _ in range(k):
+                value, digit = divmod(value, sides)
+                outcomes.append(digit + 1)
+            return outcomes
+    return rolls
 
 
 def make_fair_dice(sides):
@@ -23,6 +66,8 @@ def make_fair_dice(sides):
 
     def dice():
         return randint(1, sides)
+    dice.sides = sides
+    dice.rolls = batch_rolls(sides, getrandbits, randrange)
     return dice
 
 
@@ -30,6 +75,37 @@ four_sided = make_fair_dice(4)
 six_sided = make_fair_dice(6)
 
 
+def make_seeded_dice(sides, seed, antithetic=False):
+    """Return a fair die with SIDES sides whose outcomes are drawn from its own
+    random number generator, seeded with SEED, instead of the shared one.
+
+    Two dice made with the same SIDES and SEED produce the same outcomes. An
+    ANTITHETIC die produces SIDES + 1 minus each of those outcomes instead.
+
+    >>> dice, mirrored = make_seeded_dice(6, 61), make_seeded_dice(6, 61, True)
+    >>> rolls = [dice() for _ in range(5)]
+    >>> [7 - roll for roll in rolls] == [mirrored() for _ in range(5)]
+    True
+    >>> [7 - roll for roll in dice.rolls(10)] == mirrored.rolls(10)
+    True
+    """
+    assert type(sides) == int and sides >= 1, 'Illegal value for sides'
+    rng = Random(seed)
+    randrange = rng.randrange
+    rolls = batch_rolls(sides, rng.getrandbits, randrange)
+
+    if antithetic:
+        def dice():
+            return sides - randrange(sides)
+        dice.rolls = lambda k: [sides + 1 - outcome for outcome in rolls(k)]
+    else:
+        def dice():
+            return randrange(sides) + 1
+        dice.rolls = rolls
+    dice.sides = sides
+    return dice
+
+
 def make_test_dice(*outcomes):
     """Return a die that cycles deterministically through OUTCOMES.
 
@@ -1,6 +1,13 @@
 """CS 61A Presents The Game of Hog."""
 
-from dice import six_sided, four_sided, make_test_dice
+import multiprocessing
+import functools
+import os
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from dice import six_sided, four_sided, make_test_dice, make_seeded_dice
 from ucb import main, trace, interact
 
 GOAL_SCORE = 100  # The goal of Hog is to score 100 points.
@@ -12,6 +19,8 @@ def roll_dice(num_rolls, dice=six_sided):
     # These assert statements ensure that num_rolls is a positive integer.
     assert type(num_rolls) == int, 'num_rolls must be an integer.'
     assert num_rolls > 0, 'Must roll at least once.'
+    if hasattr(dice, 'rolls'):  # Fair dice can roll many at once.
+        return _roll_batch(num_rolls, dice.rolls)
     rolls = 0
     sum = 0
     sow_sad = 0
@@ -27,6 +36,16 @@ def roll_dice(num_rolls, dice=six_sided):
     return sum
 
 
+def _roll_batch(num_rolls, rolls):
+    """Return roll_dice(NUM_ROLLS) for a die whose ROLLS(K) returns K outcomes.
+
+    >>> _roll_batch(3, lambda k: [4, 5, 6][:k]), _roll_batch(2, lambda k: [6, 1][:k])
+    (15, 1)
+    """
+    outcomes = rolls(num_rolls)
+    return 1 if 1 in outcomes else sum(outcomes)
+
+
 def digit_fn(digit):
     """Return the corresponding function for the given DIGIT.
 
@@ -82,6 +101,113 @@ def hefty_hogs(player_score, opponent_score):
     return player_score % 30
 
 
+HEFTY_TABLE_GOAL = 1000  # Larger goals compute Hefty Hogs points on demand.
+TABLE_CACHE_SIZE = 32  # Most goals, or sets of rules, whose tables are kept
+
+
+# digit_fn(D) for NumPy arrays, for each digit D except 9
+_hefty_digit_fns = [
+    lambda value: value + 1,
+    lambda value: value * value,
+    lambda value: value * 3,
+    lambda value: value // 4,
+    lambda value: value - 5,
+    lambda value: value % 6,
+    lambda value: (value % 7) * 8,
+    lambda value: (value * 8.8).astype('int64'),
+    lambda value: (value / 99 * 15).astype('int64') + 10,
+]
+
+
+def hefty_hogs_array(player_scores, opponent_scores):
+    """Return a NumPy array of hefty_hogs(PLAYER_SCORE, OPPONENT_SCORE) for each
+    pair of scores in the arrays PLAYER_SCORES and OPPONENT_SCORES, applying
+    each digit function to every pair at once.
+
+    Values that could grow too large for exact 64-bit arithmetic, which only
+    happens after repeated squaring, are computed one at a time instead.
+
+    >>> hefty_hogs_array([44, 3, 9999], [47, 0, 1111]).tolist()
+    [22, 1, 21]
+    >>> hefty_hogs(9999, 1111)
+    21
+    """
+    import numpy as np
+    player, opponent = np.broadcast_arrays(np.asarray(player_scores, dtype=np.int64),
+                                           np.asarray(opponent_scores, dtype=np.int64))
+    value, remaining = player.copy(), opponent.copy()
+    exact = np.zeros(value.shape, dtype=bool)  # Pairs left to hefty_hogs
+    with np.errstate(all='ignore'):
+        while (remaining > 0).any():
+            active = remaining > 0
+            digit = remaining % 10
+            magnitude = np.abs(value)
+            exact |= active & ((magnitude > 2 ** 49) | ((digit == 1) & (magnitude > 2 ** 24)))
+            value[exact] = 0
+            digit[~active] = 9  # digit_fn(9) leaves the value unchanged
+            for d in range(9):
+                chosen = digit == d
+                if chosen.any():
+                    value[chosen] = _hefty_digit_fns[d](value[chosen])
+            remaining //= 10
+    points = np.where(opponent == 0, 1, value % 30)
+    for i in np.flatnonzero(exact):
+        points.flat[i] = hefty_hogs(int(player.flat[i]), int(opponent.flat[i]))
+    return points
+
+
+def hefty_hogs_table(goal=GOAL_SCORE):
+    """Return an array HEFTY of Hefty Hogs points for all scores below GOAL,
+    where HEFTY[player_score * GOAL + opponent_score] is
+    hefty_hogs(player_score, opponent_score). Each table is built once, on
+    first use, and must not be modified. GOAL may be at most HEFTY_TABLE_GOAL.
+    Only the tables of the TABLE_CACHE_SIZE most recently used goals are kept.
+
+    >>> hefty_hogs_table(10)[3 * 10 + 7] == hefty_hogs(3, 7)
+    True
+    >>> hefty_hogs_table(10) is hefty_hogs_table(10)
+    True
+    """
+    assert goal <= HEFTY_TABLE_GOAL, 'Hefty Hogs tables are limited to HEFTY_TABLE_GOAL.'
+    return _build_hefty_hogs_table(goal)
+
+
+@functools.lru_cache(maxsize=TABLE_CACHE_SIZE)
+def _build_hefty_hogs_table(goal):
+    import numpy as np
+    scores = np.arange(goal)
+    points = hefty_hogs_array(scores[:, None], scores[None, :])
+    return array('B', points.astype(np.uint8).tobytes())
+
+
+def lookup_hefty_hogs(player_score, opponent_score, goal=GOAL_SCORE):
+    """Return hefty_hogs(PLAYER_SCORE, OPPONENT_SCORE), looked up in
+    hefty_hogs_table(GOAL) when both scores are below GOAL and GOAL is at most
+    HEFTY_TABLE_GOAL.
+
+    >>> lookup_hefty_hogs(44, 47), lookup_hefty_hogs(144, 147)
+    (22, 4)
+    """
+    if goal <= HEFTY_TABLE_GOAL and 0 <= player_score < goal and 0 <= opponent_score < goal:
+        return hefty_hogs_table(goal)[player_score * goal + opponent_score]
+    return hefty_hogs(player_score, opponent_score)
+
+
+def lookup_hefty_hogs_array(player_scores, opponent_scores, goal=GOAL_SCORE):
+    """Return a NumPy array of the Hefty Hogs points for each pair of scores in
+    the arrays PLAYER_SCORES and OPPONENT_SCORES, which must be below GOAL.
+
+    >>> import numpy as np
+    >>> lookup_hefty_hogs_array(np.array([44, 3]), np.array([47, 0])).tolist()
+    [22, 1]
+    """
+    import numpy as np
+    if goal > HEFTY_TABLE_GOAL:
+        return hefty_hogs_array(player_scores, opponent_scores)
+    table = np.frombuffer(hefty_hogs_table(goal), dtype=np.uint8)
+    return table[np.asarray(player_scores) * goal + np.asarray(opponent_scores)].astype(np.int64)
+
+
 def take_turn(num_rolls, player_score, opponent_score, dice=six_sided, goal=GOAL_SCORE):
     """Simulate a turn rolling NUM_ROLLS dice,
     which may be 0 in the case of a player using Hefty Hogs.
@@ -99,7 +225,7 @@ def take_turn(num_rolls, player_score, opponent_score, dice=six_sided, goal=GOAL
     assert num_rolls <= 10, 'Cannot roll more than 10 dice.'
     assert max(player_score, opponent_score) < goal, 'The game should be over.'
     if num_rolls == 0:
-        return hefty_hogs(player_score, opponent_score)
+        return lookup_hefty_hogs(player_score, opponent_score, goal)
     else:
         return roll_dice(num_rolls, dice)
 
@@ -115,6 +241,213 @@ def hog_pile(player_score, opponent_score):
     return ones_digit
 
 
+def player_turn(num_rolls, player_score, opponent_score, dice=six_sided,
+                goal=GOAL_SCORE):
+    """Return the current player's total score after a turn rolling NUM_ROLLS
+    DICE, including any points from Hog Pile.
+
+    >>> player_turn(2, 14, 22, make_test_dice(4))
+    24
+    """
+    player_score += take_turn(num_rolls, player_score, opponent_score, dice, goal)
+    return player_score + hog_pile(player_score, opponent_score)
+
+
+#########
+# Rules #
+#########
+
+MAX_BONUS = 9  # The most points that one bonus may add, as many as Hog Pile
+
+
+class Rules:
+    """A variant of the rules of Hog: the GOAL score, the DICE, whether rolling
+    zero dice scores Hefty Hogs points (HEFTY_HOGS), whether Hog Pile applies
+    (HOG_PILE), and a sequence of extra BONUSES.
+
+    Each bonus is a function of the current player's score at the end of a
+    turn, after Hog Pile and any earlier bonuses, and the opponent's score. It
+    returns a number of points from 0 to MAX_BONUS to add to the score.
+
+    The points of zero-dice turns and of bonuses for every pair of scores below
+    GOAL are compiled once into TurnTables, which play, simulate_game,
+    hog_exact and hog_batch all read. Rules that differ only in their dice
+    share the same tables.
+
+    >>> rules = Rules(goal=50, hog_pile=False)
+    >>> rules.player_turn(2, 14, 22, make_test_dice(4)), Rules(50).player_turn(2, 14, 22, make_test_dice(4))
+    (22, 24)
+    >>> rules.tables() is Rules(50, four_sided, hog_pile=False).tables()
+    True
+    >>> def round_bonus(score, opponent_score):
+    ...     return 3 if score % 10 == 0 else 0
+    >>> Rules(bonuses=[round_bonus]).player_turn(1, 5, 0, make_test_dice(5))
+    13
+    >>> Rules(hefty_hogs=False).player_turn(0, 43, 13, make_test_dice(5))
+    46
+    """
+
+    def __init__(self, goal=GOAL_SCORE, dice=six_sided, hefty_hogs=True, hog_pile=True,
+                 bonuses=()):
+        assert type(goal) == int and goal > 0, 'The goal must be a positive integer.'
+        self.goal = goal
+        self.dice = dice
+        self.hefty_hogs = bool(hefty_hogs)
+        self.hog_pile = bool(hog_pile)
+        self.bonuses = tuple(bonuses)
+
+    def key(self):
+        """Return everything that these rules' TurnTables depend on."""
+        return (self.goal, self.hefty_hogs, self.hog_pile, self.bonuses)
+
+    def __eq__(self, other):
+        if not isinstance(other, Rules):
+            return NotImplemented
+        return self.key() == other.key() and self.dice == other.dice
+
+    def __hash__(self):
+        return hash((self.key(), self.dice))
+
+    def __repr__(self):
+        return 'Rules(goal={}, hefty_hogs={}, hog_pile={}, bonuses={})'.format(
+            self.goal, self.hefty_hogs, self.hog_pile, len(self.bonuses))
+
+    def max_bonus(self):
+        """Return the most points that Hog Pile and the bonuses add after one
+        turn."""
+        return (9 if self.hog_pile else 0) + MAX_BONUS * len(self.bonuses)
+
+    def tables(self):
+        """Return the TurnTables of these rules, compiling them on first use,
+        or None if GOAL is above HEFTY_TABLE_GOAL, in which case points are
+        computed on demand. Only the tables of the TABLE_CACHE_SIZE most
+        recently used sets of rules are kept."""
+        if self.goal > HEFTY_TABLE_GOAL:
+            return None
+        return _compile_turn_tables(*self.key())
+
+    def player_turn(self, num_rolls, player_score, opponent_score, dice=None):
+        """Return the current player's total score after a turn rolling
+        NUM_ROLLS of DICE (by default, these rules' dice), like player_turn."""
+        assert type(num_rolls) == int, 'num_rolls must be an integer.'
+        assert 0 <= num_rolls <= 10, 'Cannot roll {} dice.'.format(num_rolls)
+        assert max(player_score, opponent_score) < self.goal, 'The game should be over.'
+        if num_rolls:
+            player_score += roll_dice(num_rolls, dice or self.dice)
+        else:
+            player_score += self.zero_dice_points(player_score, opponent_score)
+        return player_score + self.bonus(player_score, opponent_score)
+
+    def zero_dice_points(self, player_score, opponent_score):
+        """Return the points scored by rolling zero dice."""
+        if not self.hefty_hogs:
+            return 0
+        return lookup_hefty_hogs(player_score, opponent_score, self.goal)
+
+    def bonus(self, player_score, opponent_score):
+        """Return the points that Hog Pile and the bonuses add to PLAYER_SCORE,
+        the current player's score at the end of a turn."""
+        tables = self.tables()
+        if tables is not None and player_score < self.goal:
+            return tables.bonus[player_score * self.goal + opponent_score]
+        score = player_score
+        if self.hog_pile:
+            score += hog_pile(score, opponent_score)
+        for bonus in self.bonuses:
+            points = bonus(score, opponent_score)
+            assert type(points) == int and 0 <= points <= MAX_BONUS, \
+                'bonus({}, {}) returned {}'.format(score, opponent_score, points)
+            score += points
+        return score - player_score
+
+    def zero_dice_points_array(self, player_scores, opponent_scores):
+        """Return a NumPy array of zero_dice_points for each pair of scores in
+        the arrays PLAYER_SCORES and OPPONENT_SCORES, which must be below GOAL.
+
+        >>> import numpy as np
+        >>> Rules().zero_dice_points_array(np.array([44, 3]), np.array([47, 0])).tolist()
+        [22, 1]
+        """
+        import numpy as np
+        if not self.hefty_hogs:
+            return np.zeros(np.shape(player_scores), dtype=np.int64)
+        return lookup_hefty_hogs_array(player_scores, opponent_scores, self.goal)
+
+    def bonus_array(self, player_scores, opponent_scores):
+        """Return a NumPy array of bonus for each pair of scores in the arrays
+        PLAYER_SCORES and OPPONENT_SCORES.
+
+        >>> import numpy as np
+        >>> Rules(goal=20).bonus_array(np.array([18, 17, 10018]), np.array([8, 8, 28])).tolist()
+        [8, 0, 8]
+        """
+        import numpy as np
+        scores = np.asarray(player_scores, dtype=np.int64)
+        opponents = np.asarray(opponent_scores, dtype=np.int64)
+        tables = self.tables()
+        if tables is None:
+            return self._compute_bonus_array(scores, opponents)
+        points = np.empty(np.broadcast(scores, opponents).shape, dtype=np.int64)
+        scores, opponents = np.broadcast_arrays(scores, opponents)
+        inside = scores < self.goal
+        bonus = np.frombuffer(tables.bonus, dtype=np.uint8)
+        points[inside] = bonus[scores[inside] * self.goal + opponents[inside]]
+        outside = ~inside
+        if outside.any():
+            points[outside] = self._compute_bonus_array(scores[outside], opponents[outside])
+        return points
+
+    def _compute_bonus_array(self, scores, opponents):
+        """Compute bonus_array for arrays of SCORES and OPPONENTS."""
+        import numpy as np
+        final = scores.copy()
+        if self.hog_pile:
+            ones_digits = final % 10
+            final += np.where(ones_digits == opponents % 10, ones_digits, 0)
+        for bonus in self.bonuses:
+            points = np.vectorize(bonus, otypes=[np.int64])(final, opponents)
+            assert ((points >= 0) & (points <= MAX_BONUS)).all(), \
+                'Bonuses must be from 0 to MAX_BONUS points.'
+            final += points
+        return final - scores
+
+
+class TurnTables:
+    """The compiled points of a set of Rules for every pair of scores below
+    its goal, indexed by player_score * goal + opponent_score:
+
+     -  ZERO_DICE_POINTS: the points for rolling zero dice.
+     -  BONUS: the points added at the end of a turn ending at player_score.
+
+    >>> tables = TurnTables(Rules(goal=20))
+    >>> tables.zero_dice_points[5 * 20 + 13], tables.bonus[18 * 20 + 8]
+    (1, 8)
+    """
+
+    def __init__(self, rules):
+        import numpy as np
+        goal = rules.goal
+        if rules.hefty_hogs:
+            self.zero_dice_points = hefty_hogs_table(goal)
+        else:
+            self.zero_dice_points = array('B', bytes(goal * goal))
+        scores = np.arange(goal)
+        grid, opponents = np.meshgrid(scores, scores, indexing='ij')
+        bonus = rules._compute_bonus_array(grid, opponents)
+        self.bonus = array('B', bonus.astype(np.uint8).tobytes())
+
+
+@functools.lru_cache(maxsize=TABLE_CACHE_SIZE)
+def _compile_turn_tables(goal, hefty_hogs, hog_pile, bonuses):
+    """Return the TurnTables shared by all Rules with these parts of their key.
+
+    >>> _ = [Rules(goal).tables() for goal in range(2, TABLE_CACHE_SIZE + 10)]
+    >>> _compile_turn_tables.cache_info().currsize <= TABLE_CACHE_SIZE
+    True
+    """
+    return TurnTables(Rules(goal, hefty_hogs=hefty_hogs, hog_pile=hog_pile, bonuses=bonuses))
+
+
 def next_player(who):
     """Return the other player, for a player WHO numbered 0 or 1.
 
@@ -131,8 +464,8 @@ def silence(score0, score1, leader=None):
     return leader, None
 
 
-def play(strategy0, strategy1, score0=0, score1=0, dice=six_sided,
-         goal=GOAL_SCORE, say=silence):
+def play(strategy0, strategy1, score0=0, score1=0, dice=None,
+         goal=GOAL_SCORE, say=silence, rules=None):
     """Simulate a game and return the final scores of both players, with Player
     0's score first, and Player 1's score second.
 
@@ -142,18 +475,35 @@ def play(strategy0, strategy1, score0=0, score1=0, dice=six_sided,
 
     strategy0:  The strategy function for Player 0, who plays first.
     strategy1:  The strategy function for Player 1, who plays second.
+                Either strategy may be a StrategyTable (see compile_strategy).
     score0:     Starting score for Player 0
     score1:     Starting score for Player 1
     dice:       A function of zero arguments that simulates a dice roll.
+                By default, the dice of RULES, or six-sided dice.
     goal:       The game ends and someone wins when this score is reached.
     say:        The commentary function to call every turn.
+    rules:      A Rules whose goal and scoring rules replace GOAL and the
+                usual rules.
     """
     who = 0  # Who is about to take a turn, 0 (first) or 1 (second)
     leader = None 
+    if rules is not None:
+        goal = rules.goal
+    elif dice is None:
+        dice = six_sided
+    # Compiled strategy tables are read directly; see compile_strategy.
+    table0 = _checked_table(strategy0, goal)
+    table1 = _checked_table(strategy1, goal)
     while score0 < goal and score1 < goal:
         if next_player(who) == 0:
-            score1 += take_turn(strategy1(score1, score0), score1, score0, dice, goal)
-            score1 += hog_pile(score1, score0)
+            if rules is not None:
+                score1 = rules.player_turn(strategy1(score1, score0), score1, score0, dice)
+            elif table1 is not None:
+                num_rolls = table1.rolls[score1 * table1.goal + score0]
+                score1 += roll_dice(num_rolls, dice) if num_rolls else lookup_hefty_hogs(score1, score0, goal)
+                score1 += hog_pile(score1, score0)
+            else:
+                score1 = player_turn(strategy1(score1, score0), score1, score0, dice, goal)
             who = 0
             curr_leader = 1
             current_leader, message = say(score0, score1, leader)
@@ -162,8 +512,14 @@ def play(strategy0, strategy1, score0=0, score1=0, dice=six_sided,
             if message != None:
                 print(message)
         elif next_player(who) == 1:
-            score0 += take_turn(strategy0(score0, score1), score0, score1, dice, goal)
-            score0 += hog_pile(score0, score1)
+            if rules is not None:
+                score0 = rules.player_turn(strategy0(score0, score1), score0, score1, dice)
+            elif table0 is not None:
+                num_rolls = table0.rolls[score0 * table0.goal + score1]
+                score0 += roll_dice(num_rolls, dice) if num_rolls else lookup_hefty_hogs(score0, score1, goal)
+                score0 += hog_pile(score0, score1)
+            else:
+                score0 = player_turn(strategy0(score0, score1), score0, score1, dice, goal)
             who = 1
             curr_leader = 0
             current_leader, message = say(score0, score1, leader)
@@ -174,6 +530,82 @@ def play(strategy0, strategy1, score0=0, score1=0, dice=six_sided,
     return score0, score1
 
 
+def simulate_game(strategy0, strategy1, score0=0, score1=0, dice=None,
+                  goal=GOAL_SCORE, rules=None):
+    """Simulate a game like play, with the same strategies, dice and RULES, but
+    without commentary or printing, and return the final scores.
+
+    >>> import io
+    >>> from contextlib import redirect_stdout
+    >>> def same_as_play(strategy0, strategy1, seed):
+    ...     random.seed(seed)
+    ...     with redirect_stdout(io.StringIO()):
+    ...         expected = play(strategy0, strategy1)
+    ...     random.seed(seed)
+    ...     return simulate_game(strategy0, strategy1) == expected
+    >>> table = compile_strategy(hefty_hogs_strategy)
+    >>> pairs = [(always_roll(4), hog_pile_strategy), (table, always_roll(6)),
+    ...          (final_strategy, table)]
+    >>> all(same_as_play(strategy0, strategy1, seed)
+    ...     for strategy0, strategy1 in pairs for seed in range(200))
+    True
+    >>> variant = Rules(goal=60, hog_pile=False, bonuses=[lambda score, opponent: score % 2])
+    >>> random.seed(3)
+    >>> with redirect_stdout(io.StringIO()):
+    ...     expected = play(table, hog_pile_strategy, rules=variant)
+    >>> random.seed(3)
+    >>> simulate_game(table, hog_pile_strategy, rules=variant) == expected
+    True
+
+    Without DICE, games are rolled with the dice of RULES, which the exact
+    solver in hog_exact also uses.
+
+    >>> from hog_exact import compare_strategies
+    >>> four = Rules(goal=30, dice=four_sided)
+    >>> three, five = compile_strategy(always_roll(3), 30), compile_strategy(always_roll(5), 30)
+    >>> random.seed(0)
+    >>> simulated = sum(simulate_game(three, five, rules=four)[0] >= 30
+    ...                 for _ in range(20000)) / 20000
+    >>> abs(simulated - compare_strategies(three, five, rules=four)) < 0.015
+    True
+    >>> random.seed(1)
+    >>> with redirect_stdout(io.StringIO()):
+    ...     expected = play(three, always_roll(2), rules=four)
+    >>> random.seed(1)
+    >>> simulate_game(three, always_roll(2), rules=four) == expected
+    True
+    """
+    if rules is not None:
+        goal = rules.goal
+    elif dice is None:
+        dice = six_sided
+    tables = (_checked_table(strategy0, goal), _checked_table(strategy1, goal))
+    strategies = (strategy0, strategy1)
+    scores = [score0, score1]
+    who = 0
+    while scores[0] < goal and scores[1] < goal:
+        score, opponent_score = scores[who], scores[1 - who]
+        table = tables[who]
+        if rules is not None:
+            if table is not None:
+                num_rolls = table.rolls[score * table.goal + opponent_score]
+            else:
+                num_rolls = strategies[who](score, opponent_score)
+            scores[who] = rules.player_turn(num_rolls, score, opponent_score, dice)
+        elif table is not None:
+            num_rolls = table.rolls[score * table.goal + opponent_score]
+            if num_rolls:
+                score += roll_dice(num_rolls, dice)
+            else:
+                score += lookup_hefty_hogs(score, opponent_score, goal)
+            scores[who] = score + hog_pile(score, opponent_score)
+        else:
+            num_rolls = strategies[who](score, opponent_score)
+            scores[who] = player_turn(num_rolls, score, opponent_score, dice, goal)
+        who = 1 - who
+    return scores[0], scores[1]
+
+
 def say_scores(score0, score1, player=None):
     """A commentary function that announces the score for each player."""
     message = f"Player 0 now has {score0} and now Player 1 has {score1}"
@@ -202,15 +634,107 @@ def announce_lead_changes(score0, score1, last_leader=None):
 def both(f, g):
     """A commentary function that says what f says, then what g says.
     """
+    return commentary(f, g)
+
+
+def commentary(*functions, lazy=False):
+    """Return a commentary function that says what each of FUNCTIONS says, in
+    order, like nested calls to both. Commentary functions that were combined
+    by commentary or both are flattened into one list, so each turn makes one
+    call to each function however deeply they were combined.
+
+    Each function is given the same leader, and the leader returned is the
+    one returned by the last function. If LAZY is True, only the last function
+    is called right away and the message is a LazyMessage: the other functions
+    are called when the message is read, which assumes that they have no side
+    effects.
+
+    >>> say = commentary(both(say_scores, say_scores), announce_lead_changes)
+    >>> len(say.parts)
+    3
+    >>> leader, message = say(3, 1)
+    >>> leader
+    0
+    >>> print(message)
+    Player 0 now has 3 and now Player 1 has 1
+    Player 0 now has 3 and now Player 1 has 1
+    Player 0 takes the lead by 2
+    >>> def loud(score0, score1, player=None):
+    ...     print('formatting')
+    ...     return player, 'Scores are ' + str(score0 + score1)
+    >>> leader, message = commentary(loud, announce_lead_changes, lazy=True)(3, 1)
+    >>> leader
+    0
+    >>> print(message)
+    formatting
+    Scores are 4
+    Player 0 takes the lead by 2
+    """
+    assert functions, 'Need at least one commentary function.'
+    parts = []
+    for f in functions:
+        parts.extend(getattr(f, 'parts', (f,)))
+    *pending, last = parts
+
     def say(score0, score1, player=None):
-        f_player, f_message = f(score0, score1, player)
-        g_player, g_message = g(score0, score1, player)
-        if f_message and g_message:
-            return g_player, f_message + "\n" + g_message
-        else:
-            return g_player, f_message or g_message
+        if lazy and pending:
+            last_player, last_message = last(score0, score1, player)
+            return last_player, LazyMessage(pending, (score0, score1, player), last_message)
+        messages = []
+        for f in parts:
+            last_player, message = f(score0, score1, player)
+            messages.append(message)
+        return last_player, join_messages(messages)
+    say.parts = tuple(parts)
     return say
 
+
+def join_messages(messages):
+    """Join the commentary MESSAGES that are not empty with newlines, or
+    return the last message if they are all empty."""
+    said = [str(message) for message in messages if message]
+    return '\n'.join(said) if said else messages[-1]
+
+
+class LazyMessage:
+    """The message of a lazy commentary function (see commentary), which calls
+    the functions in PENDING with ARGS and joins their messages to LAST only
+    when it is first read with str, print, a comparison or a truth test.
+    Read it with resolve() to get a string, or None if nothing was said.
+    """
+
+    def __init__(self, pending, args, last):
+        self.pending = pending
+        self.args = args
+        self.last = last
+        self.text = None
+
+    def resolve(self):
+        if self.pending is not None:
+            messages = [f(*self.args)[1] for f in self.pending]
+            self.text = join_messages(messages + [self.last])
+            self.pending = self.args = self.last = None
+        if isinstance(self.text, LazyMessage):
+            return self.text.resolve()
+        return self.text
+
+    def __str__(self):
+        return str(self.resolve())
+
+    def __repr__(self):
+        return repr(self.resolve())
+
+    def __bool__(self):
+        return bool(self.resolve())
+
+    def __eq__(self, other):
+        if isinstance(other, LazyMessage):
+            other = other.resolve()
+        return self.resolve() == other
+
+    __hash__ = None
+
+
 def always_roll(n):
     """Return a strategy that always rolls N dice.
 
@@ -223,6 +747,115 @@ def always_roll(n):
     return strategy
 
 
+class StrategyTable:
+    """A strategy stored as a compact GOAL x GOAL table of numbers of dice.
+
+    A StrategyTable can be called like any other strategy, but play looks up
+    its numbers of dice directly, without calling a function or checking the
+    result on every turn. Tables are made by compile_strategy.
+
+    >>> table = compile_strategy(always_roll(4), goal=10)
+    >>> table(3, 7)
+    4
+    >>> table[3][7], len(table)
+    (4, 10)
+    """
+    def __init__(self, rolls, goal):
+        assert isinstance(rolls, _LazyRolls) or len(rolls) == goal * goal, \
+            'A strategy table needs GOAL x GOAL entries.'
+        self.rolls = rolls  # rolls[score * goal + opponent_score]
+        self.goal = goal
+
+    def __call__(self, score, opponent_score):
+        assert 0 <= score < self.goal and 0 <= opponent_score < self.goal, \
+            'strategy({}, {}) is outside of the table'.format(score, opponent_score)
+        return self.rolls[score * self.goal + opponent_score]
+
+    def __getitem__(self, score):
+        """Return the row of numbers of dice for SCORE."""
+        start = score * self.goal
+        if isinstance(self.rolls, _LazyRolls):
+            return [self.rolls[i] for i in range(start, start + self.goal)]
+        return self.rolls[start:start + self.goal]
+
+    def __len__(self):
+        return self.goal
+
+    def __repr__(self):
+        return 'StrategyTable(goal={})'.format(self.goal)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        if isinstance(self.rolls, memoryview):  # e.g. a memory-mapped file
+            state['rolls'] = array('b', self.rolls)
+        return state
+
+    def rolls_array(self):
+        """Return the numbers of dice for every pair of scores as an array('b'),
+        filling in any that a lazy table has not computed yet."""
+        if isinstance(self.rolls, _LazyRolls):
+            return array('b', (self.rolls[i] for i in range(self.goal * self.goal)))
+        return self.rolls
+
+
+class _LazyRolls(dict):
+    """The numbers of dice of a lazily compiled StrategyTable, keyed by
+    score * GOAL + opponent_score and computed when first looked up."""
+
+    def __init__(self, strategy, goal):
+        self.strategy = strategy
+        self.goal = goal
+
+    def __missing__(self, index):
+        score, opponent_score = divmod(index, self.goal)
+        assert 0 <= score < self.goal, 'strategy({}, {}) is outside of the table'.format(
+            score, opponent_score)
+        num_rolls = self.strategy(score, opponent_score)
+        msg = 'strategy({}, {}) returned {}'.format(score, opponent_score, num_rolls)
+        assert type(num_rolls) == int, msg + ' (not an integer)'
+        assert 0 <= num_rolls <= 10, msg + ' (invalid number of rolls)'
+        self[index] = num_rolls
+        return num_rolls
+
+
+def compile_strategy(strategy, goal=GOAL_SCORE, lazy=False):
+    """Return a StrategyTable of STRATEGY for all scores below GOAL, checking
+    once that every number of dice is an integer from 0 to 10.
+
+    A LAZY table calls STRATEGY for each pair of scores only when a game first
+    reaches it, and stores only those, which suits large goals.
+
+    >>> compile_strategy(always_roll(11), goal=5)
+    Traceback (most recent call last):
+     ...
+    AssertionError: strategy(0, 0) returned 11 (invalid number of rolls)
+    >>> table = compile_strategy(always_roll(4), goal=10000, lazy=True)
+    >>> simulate_game(table, table, goal=10000)[0] >= 0, len(table.rolls) < 10000
+    (True, True)
+    """
+    if isinstance(strategy, StrategyTable) and strategy.goal == goal:
+        return strategy
+    if lazy:
+        return StrategyTable(_LazyRolls(strategy, goal), goal)
+    rolls = array('b')
+    for score in range(goal):
+        for opponent_score in range(goal):
+            num_rolls = strategy(score, opponent_score)
+            msg = 'strategy({}, {}) returned {}'.format(score, opponent_score, num_rolls)
+            assert type(num_rolls) == int, msg + ' (not an integer)'
+            assert 0 <= num_rolls <= 10, msg + ' (invalid number of rolls)'
+            rolls.append(num_rolls)
+    return StrategyTable(rolls, goal)
+
+
+def _checked_table(strategy, goal):
+    """Return STRATEGY if it is a StrategyTable that covers every score below
+    GOAL, and None otherwise."""
+    if isinstance(strategy, StrategyTable) and strategy.goal >= goal:
+        return strategy
+    return None
+
+
 def make_averaged(original_function, total_samples=1000):
     """Return a function that returns the average value of ORIGINAL_FUNCTION
     called TOTAL_SAMPLES times.
@@ -241,13 +874,142 @@ def make_averaged(original_function, total_samples=1000):
     return average_function
 
 
-def max_scoring_num_rolls(dice=six_sided, total_samples=1000):
+MIN_SAMPLES_PER_WORKER = 1000  # Smaller shards are not worth a process.
+
+_parallel_job = None  # Set only in worker processes by _init_parallel_job
+
+
+def make_averaged_parallel(original_function, total_samples=1000, seed=None,
+                           workers=None):
+    """Return a function that returns the average value of ORIGINAL_FUNCTION
+    called TOTAL_SAMPLES times, like make_averaged, but split the samples
+    across WORKERS processes (by default, one per CPU).
+
+    Each shard of samples seeds the random module with its own seed, derived
+    from SEED, so the result is reproducible for a given SEED and number of
+    workers. When there are too few samples to give every worker at least
+    MIN_SAMPLES_PER_WORKER, or when processes cannot be forked, the samples
+    are taken serially in this process.
+
+    >>> averaged_dice = make_averaged_parallel(six_sided, 100, seed=61)
+    >>> averaged_dice() == averaged_dice()
+    True
+
+    With enough samples, the shards are taken by separate workers and give the
+    same result as taking each shard in turn.
+
+    >>> parallel_dice = make_averaged_parallel(six_sided, 4001, seed=61, workers=2)
+    >>> seeds = random.Random(61).sample(range(2 ** 32), 2)
+    >>> serial_total = (_sample_sum(six_sided, (), 2001, seeds[0])
+    ...                 + _sample_sum(six_sided, (), 2000, seeds[1]))
+    >>> parallel_dice() == parallel_dice() == serial_total / 4001
+    True
+    """
+    def average_function(*args):
+        num_workers = min(workers or os.cpu_count() or 1,
+                          total_samples // MIN_SAMPLES_PER_WORKER)
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            num_workers = 1
+        num_workers = max(num_workers, 1)
+        seeds = random.Random(seed).sample(range(2 ** 32), num_workers)
+        shards = [total_samples // num_workers + (i < total_samples % num_workers)
+                  for i in range(num_workers)]
+        if num_workers == 1:
+            state = random.getstate()
+            try:
+                return _sample_sum(original_function, args, shards[0], seeds[0]) / total_samples
+            finally:
+                random.setstate(state)
+        # Forked workers receive the job without pickling, so closures work.
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(num_workers, mp_context=context,
+                                 initializer=_init_parallel_job,
+                                 initargs=(original_function, args)) as executor:
+            totals = executor.map(_parallel_sample_sum, shards, seeds)
+            return sum(totals) / total_samples
+    return average_function
+
+
+def _sample_sum(original_function, args, samples, seed):
+    """Return the sum of SAMPLES calls to ORIGINAL_FUNCTION(*ARGS) after
+    seeding the random module with SEED."""
+    random.seed(seed)
+    total = 0
+    for _ in range(samples):
+        total += original_function(*args)
+    return total
+
+
+def _init_parallel_job(original_function, args):
+    """Store the job of make_averaged_parallel in a new worker process."""
+    global _parallel_job
+    _parallel_job = (original_function, args)
+
+
+def _parallel_sample_sum(samples, seed):
+    """Run _sample_sum on the job stored by _init_parallel_job."""
+    original_function, args = _parallel_job
+    return _sample_sum(original_function, args, samples, seed)
+
+
+def make_averaged_adaptive(original_function, tolerance=0.01,
+                           max_samples=100000, min_samples=100, z=1.96):
+    """Return a function that keeps calling ORIGINAL_FUNCTION until the
+    standard error of the average drops to TOLERANCE or MAX_SAMPLES calls have
+    been made, whichever comes first. At least MIN_SAMPLES calls are made.
+
+    The function returns (ESTIMATE, (LOW, HIGH), SAMPLES): the average, the
+    confidence interval of ESTIMATE plus or minus Z standard errors, and the
+    number of calls made.
+
+    >>> averaged = make_averaged_adaptive(make_test_dice(3), tolerance=0.1)
+    >>> averaged()
+    (3.0, (3.0, 3.0), 100)
+    >>> estimate, interval, samples = make_averaged_adaptive(make_test_dice(1, 6), max_samples=500)()
+    >>> estimate, samples
+    (3.5, 500)
+    """
+    assert 2 <= min_samples <= max_samples, 'Need at least two samples.'
+
+    def average_function(*args):
+        # Welford's algorithm keeps a running mean and sum of squared deviations.
+        samples, mean, squares = 0, 0.0, 0.0
+        std_error = tolerance + 1
+        while samples < max_samples and (samples < min_samples or std_error > tolerance):
+            value = original_function(*args)
+            samples += 1
+            delta = value - mean
+            mean += delta / samples
+            squares += delta * (value - mean)
+            if samples >= 2:
+                std_error = (squares / (samples - 1) / samples) ** 0.5
+        return mean, (mean - z * std_error, mean + z * std_error), samples
+    return average_function
+
+
+def max_scoring_num_rolls(dice=six_sided, total_samples=1000, tolerance=None):
     """Return the number of dice (1 to 10) that gives the highest average turn score
     by calling roll_dice with the provided DICE a total of TOTAL_SAMPLES times.
     Assume that the dice always return positive outcomes.
+
+    If TOLERANCE is given, each average is instead estimated by
+    make_averaged_adaptive, taking at most TOTAL_SAMPLES samples but stopping
+    once its standard error is below TOLERANCE. At least two samples are
+    always taken, since a standard error needs two.
+
+    >>> max_scoring_num_rolls(make_test_dice(3), total_samples=1, tolerance=0.1)
+    10
     """
+    numdice = 1
+    maximumroll = 0
+    max_num = 1
     while numdice <= 10:
-        c_roll = make_averaged(roll_dice, total_samples)(numdice, dice)
+        if tolerance is None:
+            c_roll = make_averaged(roll_dice, total_samples)(numdice, dice)
+        else:
+            averaged = make_averaged_adaptive(roll_dice, tolerance, max(2, total_samples),
+                                              max(2, min(100, total_samples)))
+            c_roll = averaged(numdice, dice)[0]
         if c_roll > maximumroll:
             maximumroll = c_roll
             max_num = numdice
@@ -255,20 +1017,166 @@ def max_scoring_num_rolls(dice=six_sided, total_samples=1000):
     return max_num
 
 def winner(strategy0, strategy1):
-    score0, score1 = play(strategy0, strategy1)
+    score0, score1 = simulate_game(strategy0, strategy1)
     if score0 > score1:
         return 0
     else:
         return 1
 
 
-def average_win_rate(strategy, baseline=always_roll(6)):
-    win_rate_as_player_0 = 1 - make_averaged(winner)(strategy, baseline)
-    win_rate_as_player_1 = make_averaged(winner)(baseline, strategy)
+def average_win_rate(strategy, baseline=always_roll(6), tolerance=None,
+                     compile_strategies=False):
+    """Return the average win rate of STRATEGY against BASELINE.
+
+    If TOLERANCE is given, the win rate in each seat is estimated by
+    make_averaged_adaptive until its standard error is below TOLERANCE.
+
+    Strategies that are StrategyTables are read directly instead of being
+    called on every turn. If COMPILE_STRATEGIES is True, both strategies are
+    compiled into StrategyTables first, which is only the same game for
+    strategies that always choose the same number of dice for the same scores.
+
+    >>> random.seed(5)
+    >>> called = average_win_rate(hefty_hogs_strategy)
+    >>> random.seed(5)
+    >>> called == average_win_rate(hefty_hogs_strategy, compile_strategies=True)
+    True
+    >>> def moody(score, opponent_score):
+    ...     return random.choice([1, 10])
+    >>> random.seed(5)
+    >>> compiled = average_win_rate(moody, compile_strategies=True)
+    >>> random.seed(5)
+    >>> compiled == average_win_rate(moody)
+    False
+    """
+    if compile_strategies:
+        strategy, baseline = compile_strategy(strategy), compile_strategy(baseline)
+    if tolerance is None:
+        averaged_winner = make_averaged(winner)
+    else:
+        adaptive_winner = make_averaged_adaptive(winner, tolerance)
+
+        def averaged_winner(*args):
+            return adaptive_winner(*args)[0]
+    win_rate_as_player_0 = 1 - averaged_winner(strategy, baseline)
+    win_rate_as_player_1 = averaged_winner(baseline, strategy)
 
     return (win_rate_as_player_0 + win_rate_as_player_1) / 2
 
 
+def common_dice_win_rates(strategies, baseline=always_roll(6), total_samples=1000,
+                          seed=0, antithetic=False, sides=6, compile_strategies=False):
+    """Return a list of the average win rates of each of STRATEGIES against
+    BASELINE, estimated with common random numbers.
+
+    Every strategy plays the same TOTAL_SAMPLES seeded streams of dice with
+    SIDES sides, once as Player 0 and once as Player 1, so differences between
+    the win rates come from the strategies rather than from luck. Within a
+    stream, each player's Kth turn always uses the same dice. If ANTITHETIC is
+    True, each stream is also replayed with mirrored dice (see
+    make_seeded_dice). COMPILE_STRATEGIES compiles every strategy first, as
+    in average_win_rate.
+
+    >>> rates = common_dice_win_rates([always_roll(4), always_roll(6)], total_samples=200, seed=1)
+    >>> rates == common_dice_win_rates([always_roll(4), always_roll(6)], total_samples=200, seed=1)
+    True
+    >>> rates[1]
+    0.5
+    >>> (common_dice_win_rates([hefty_hogs_strategy], total_samples=50)
+    ...  == common_dice_win_rates([hefty_hogs_strategy], total_samples=50, compile_strategies=True))
+    True
+    """
+    return [sum(rates) / len(rates) for rates in
+            _stream_win_rates(strategies, baseline, total_samples, seed,
+                              antithetic, sides, compile_strategies)]
+
+
+def compare_win_rates(strategy0, strategy1, baseline=always_roll(6),
+                      total_samples=1000, seed=0, antithetic=False, sides=6,
+                      compile_strategies=False):
+    """Return (DIFFERENCE, STD_ERROR), the difference between the average win
+    rates of STRATEGY0 and STRATEGY1 against BASELINE and its standard error,
+    estimated with common random numbers as in common_dice_win_rates.
+
+    >>> compare_win_rates(always_roll(5), always_roll(5), total_samples=200, antithetic=True)
+    (0.0, 0.0)
+    >>> difference, std_error = compare_win_rates(always_roll(6), always_roll(1),
+    ...                                           total_samples=200, sides=4)
+    >>> difference > 3 * std_error
+    True
+    """
+    rates0, rates1 = _stream_win_rates([strategy0, strategy1], baseline, total_samples,
+                                       seed, antithetic, sides, compile_strategies)
+    differences = [rate0 - rate1 for rate0, rate1 in zip(rates0, rates1)]
+    n = len(differences)
+    mean = sum(differences) / n
+    variance = sum((d - mean) ** 2 for d in differences) / (n - 1) if n > 1 else 0.0
+    return mean, (variance / n) ** 0.5
+
+
+def _stream_win_rates(strategies, baseline, total_samples, seed, antithetic, sides,
+                      compile_strategies):
+    """Return a list for each of STRATEGIES of its win rate against BASELINE
+    on each of TOTAL_SAMPLES seeded dice streams, averaged over both seats and,
+    if ANTITHETIC is True, over the mirrored stream as well."""
+    if compile_strategies:
+        baseline = compile_strategy(baseline)
+    seeds = random.Random(seed).sample(range(2 ** 32), total_samples)
+    mirrors = (False, True) if antithetic else (False,)
+    results = []
+    for strategy in strategies:
+        if compile_strategies:
+            strategy = compile_strategy(strategy)
+        rates = []
+        for stream_seed in seeds:
+            wins = 0
+            for mirrored in mirrors:
+                score0, score1 = _play_stream(strategy, baseline, stream_seed,
+                                              mirrored, sides)
+                wins += score0 > score1
+                score0, score1 = _play_stream(baseline, strategy, stream_seed,
+                                              mirrored, sides)
+                wins += score1 > score0
+            rates.append(wins / (2 * len(mirrors)))
+        results.append(rates)
+    return results
+
+
+def _play_stream(strategy0, strategy1, stream_seed, mirrored, sides):
+    """Play a game between STRATEGY0 and STRATEGY1, either of which may be a
+    StrategyTable, following the rules of play without commentary, and return
+    the final scores.
+
+    Each player rolls their own die, seeded by STREAM_SEED and the player, and
+    every turn takes the next 10 of its outcomes whether or not they are all
+    rolled. Different strategies in the same seat then see the same dice on
+    the same turn, no matter how many dice were rolled before.
+    """
+    player_dice = [make_seeded_dice(sides, (stream_seed << 1) + who, mirrored)
+                   for who in (0, 1)]
+    goal = GOAL_SCORE
+    strategies = (strategy0, strategy1)
+    tables = (_checked_table(strategy0, goal), _checked_table(strategy1, goal))
+    scores = [0, 0]
+    who = 0
+    while scores[0] < goal and scores[1] < goal:
+        score, opponent_score = scores[who], scores[1 - who]
+        outcomes = player_dice[who].rolls(10)
+        table = tables[who]
+        if table is not None:
+            num_rolls = table.rolls[score * table.goal + opponent_score]
+        else:
+            num_rolls = strategies[who](score, opponent_score)
+            assert 0 <= num_rolls <= 10, 'Cannot roll {} dice.'.format(num_rolls)
+        if num_rolls:
+            score += roll_dice(num_rolls, iter(outcomes).__next__)
+        else:
+            score += lookup_hefty_hogs(score, opponent_score, goal)
+        scores[who] = score + hog_pile(score, opponent_score)
+        who = next_player(who)
+    return scores[0], scores[1]
+
+
 def run_experiments():
     """Run a series of strategy experiments and report results."""
     six_sided_max = max_scoring_num_rolls(six_sided)
@@ -286,7 +1194,7 @@ def hefty_hogs_strategy(score, opponent_score, threshold=8, num_rolls=6):
     """This strategy returns 0 dice if that gives at least THRESHOLD points, and
     returns NUM_ROLLS otherwise.
     """
-    if hefty_hogs(score, opponent_score) >= threshold:
+    if lookup_hefty_hogs(score, opponent_score) >= threshold:
         return 0
     else:
         return num_rolls
@@ -296,12 +1204,25 @@ def hog_pile_strategy(score, opponent_score, threshold=8, num_rolls=6):
     effect. It also returns 0 dice if it gives at least THRESHOLD points.
     Otherwise, it returns NUM_ROLLS.
     """
-    temp_score = (score + hefty_hogs(score, opponent_score))
+    temp_score = (score + lookup_hefty_hogs(score, opponent_score))
 
     if hog_pile(temp_score, opponent_score) != 0:
         return 0
     else:
-        return hefty_hogs_strategy(score, opponent_score, threshold, num_rolls) 
+        return hefty_hogs_strategy(score, opponent_score, threshold, num_rolls)
+
+
+def final_strategy(score, opponent_score):
+    """Roll the number of dice that maximizes the chance of winning.
+
+    The exact win probability of every state is computed once by
+    hog_exact.solve_optimal, which accounts for Hefty Hogs, Hog Pile and the
+    full distribution of roll_dice outcomes.
+    """
+    from hog_exact import optimal_strategy_table
+    if max(score, opponent_score) >= GOAL_SCORE:
+        return 0  # The game is already over.
+    return optimal_strategy_table()[score][opponent_score]
 
 ##########################
 # Command Line Interface #
@@ -0,0 +1,144 @@
+"""Simulate many games of Hog at once with NumPy.
+
+Calling hog.play once per game spends most of its time in the Python
+interpreter. The functions in this module instead advance a whole batch of
+games in lockstep, one turn at a time, using arrays for the scores, the
+current player and the dice. Strategies are given as GOAL x GOAL tables
+indexed as TABLE[score][opponent_score], like the tables produced by
+calc.export, or as compiled hog.StrategyTables. The rules of the game come
+from a hog.Rules, which compiles the points of zero-dice turns and bonuses
+once for every batch.
+"""
+
+import numpy as np
+
+from dice import six_sided
+from hog import GOAL_SCORE, Rules, StrategyTable
+from hog_exact import MAX_ROLLS, face_probabilities
+
+
+def _strategy_lookup(table, goal):
+    """Return a function that maps an array of indices score * GOAL +
+    opponent_score to the numbers of dice that TABLE rolls in those states.
+
+    Compiled tables and integer arrays are read in place. The entries of lazily
+    compiled tables are only computed for the states that the games reach.
+    """
+    if isinstance(table, StrategyTable):
+        assert table.goal == goal, 'Strategy tables must be GOAL x GOAL.'
+        if isinstance(table.rolls, dict):  # compiled with lazy=True
+            rolls = table.rolls
+
+            def lookup(indices):
+                unique, inverse = np.unique(indices, return_inverse=True)
+                found = np.array([rolls[i] for i in unique.tolist()], dtype=np.int8)
+                return found[inverse]
+            return lookup
+        flat = np.frombuffer(table.rolls, dtype=np.int8)
+    else:
+        array = np.asarray(table)
+        if array.dtype.kind not in 'iu':
+            array = array.astype(np.int8)
+        array = array[:goal, :goal]
+        assert array.shape == (goal, goal), 'Strategy tables must be GOAL x GOAL.'
+        assert ((array >= 0) & (array <= MAX_ROLLS)).all(), 'Invalid number of rolls.'
+        flat = np.ascontiguousarray(array, dtype=np.int8).reshape(-1)
+    return flat.__getitem__
+
+
+def _roll(rng, num_rolls, probabilities):
+    """Return the outcomes of roll_dice(N) for each N in the array NUM_ROLLS,
+    drawing the dice from the NumPy Generator RNG.
+    """
+    shape = (len(num_rolls), MAX_ROLLS)
+    sides = len(probabilities)
+    if len(set(probabilities)) == 1:
+        rolls = rng.integers(1, sides + 1, size=shape)
+    else:
+        rolls = rng.choice(np.arange(1, sides + 1), size=shape, p=probabilities)
+    used = np.arange(MAX_ROLLS) < num_rolls[:, None]
+    rolls = np.where(used, rolls, 0)
+    return np.where((rolls == 1).any(axis=1), 1, rolls.sum(axis=1))
+
+
+def play_batch(strategy0_table, strategy1_table, n_games, seed=None,
+               goal=GOAL_SCORE, dice=six_sided, rules=None):
+    """Simulate N_GAMES independent games starting from (0, 0) and return
+    (SCORE0, SCORE1), two arrays of final scores.
+
+    The games follow the same rules as hog.play with no commentary, or RULES,
+    a hog.Rules that replaces GOAL and DICE, if given. Dice are drawn from a
+    NumPy Generator seeded with SEED, so a batch is reproducible.
+    A game in which both players keep rolling zero dice for zero points would
+    never end; it is stopped with both scores below GOAL.
+
+    >>> always_6 = [[6] * 100] * 100
+    >>> score0, score1 = play_batch(always_6, always_6, 1000, seed=61)
+    >>> len(score0), bool((np.maximum(score0, score1) >= 100).all())
+    (1000, True)
+    >>> first = play_batch(always_6, always_6, 10, seed=1)
+    >>> second = play_batch(always_6, always_6, 10, seed=1)
+    >>> all((a == b).all() for a, b in zip(first, second))
+    True
+    >>> from hog import always_roll, compile_strategy
+    >>> lazy_6 = compile_strategy(always_roll(6), 10000, lazy=True)
+    >>> score0, score1 = play_batch(lazy_6, lazy_6, 10, seed=2, goal=10000)
+    >>> bool((np.maximum(score0, score1) >= 10000).all()), len(lazy_6.rolls) < 10 ** 6
+    (True, True)
+    """
+    rules = rules or Rules(goal, dice)
+    goal = rules.goal
+    probabilities = face_probabilities(rules.dice)
+    rng = np.random.default_rng(seed)
+    strategies = (_strategy_lookup(strategy0_table, goal),
+                  _strategy_lookup(strategy1_table, goal))
+
+    scores = np.zeros((n_games, 2), dtype=np.int64)
+    who = np.zeros(n_games, dtype=np.int64)
+    stalled = np.zeros(n_games, dtype=bool)  # Whether the last turn scored 0
+    active = np.arange(n_games)
+    while len(active):
+        current = who[active]
+        score = scores[active, current]
+        opponent_score = scores[active, 1 - current]
+        indices = score * goal + opponent_score
+        num_rolls = np.empty(len(active), dtype=np.int64)
+        for player in (0, 1):
+            turns = current == player
+            num_rolls[turns] = strategies[player](indices[turns])
+
+        points = _roll(rng, num_rolls, probabilities)
+        zero = num_rolls == 0
+        if zero.any():
+            points[zero] = rules.zero_dice_points_array(score[zero], opponent_score[zero])
+        end_score = score + points
+        end_score += rules.bonus_array(end_score, opponent_score)
+
+        scored = end_score > score
+        scores[active, current] = end_score
+        who[active] = 1 - current
+        looping = stalled[active] & ~scored
+        stalled[active] = ~scored
+        active = active[(end_score < goal) & ~looping]
+    return scores[:, 0], scores[:, 1]
+
+
+def win_rate_batch(strategy0_table, strategy1_table, n_games, seed=None,
+                   goal=GOAL_SCORE, dice=six_sided, rules=None):
+    """Return the fraction of N_GAMES simulated games that Player 0 wins when
+    playing STRATEGY0_TABLE against STRATEGY1_TABLE.
+
+    >>> always_6 = [[6] * 100] * 100
+    >>> abs(win_rate_batch(always_6, always_6, 100000, seed=0) - 0.534134) < 0.01
+    True
+    >>> from hog_exact import compare_strategies
+    >>> plain = Rules(goal=60, hefty_hogs=False, hog_pile=False)
+    >>> always_4 = [[4] * 60] * 60
+    >>> exact = compare_strategies(always_4, always_6, rules=plain)
+    >>> abs(win_rate_batch(always_4, always_6, 100000, seed=0, rules=plain) - exact) < 0.01
+    True
+    """
+    rules = rules or Rules(goal, dice)
+    score0, score1 = play_batch(strategy0_table, strategy1_table, n_games, seed,
+                                rules=rules)
+    return float(np.mean(score0 >= rules.goal))
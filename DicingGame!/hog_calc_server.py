@@ -0,0 +1,143 @@
+"""A local stand-in for the hog-calc server, which compares Hog strategies.
+
+Strategies are sent as GOAL x GOAL tables, like those produced by calc.export,
+and compared exactly with hog_exact.compare_strategies. A batch request can
+compare many pairs of strategies at once. Identical tables are recognized by
+a hash of their contents, the same hog_tournament.strategy_key used by
+tournaments, and win rates already computed for a pair of tables are answered
+from a least-recently-used cache.
+
+Run the server with python3 hog_calc_server.py -s, and compare strategies
+against it with python3 calc.py --server http://localhost:31416.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from gui_files.common_server import route, start
+
+import hog
+from hog_exact import compare_strategies, strategy_rolls
+from hog_tournament import strategy_key
+
+PORT = 31416
+DEFAULT_SERVER = "http://localhost:{}".format(PORT)
+GUI_FOLDER = "gui_files/"
+
+RESULT_LIMIT = 100000  # Most win rates kept between requests
+
+
+class ResultCache:
+    """Win rates keyed by the pair of table keys of the strategies that
+    played, evicting the least recently used beyond LIMIT.
+
+    >>> cache = ResultCache(limit=2)
+    >>> cache.get_or_compute(('a', 'b'), lambda: 0.25)
+    0.25
+    >>> cache.get_or_compute(('a', 'b'), lambda: 1 / 0)
+    0.25
+    >>> cache.get_or_compute(('b', 'a'), lambda: 0.5), cache.hits, cache.misses
+    (0.5, 1, 2)
+    >>> _ = cache.get_or_compute(('a', 'c'), lambda: 0.75)
+    >>> ('a', 'b') in cache, ('b', 'a') in cache
+    (False, True)
+    """
+
+    def __init__(self, limit=RESULT_LIMIT):
+        self.limit = limit
+        self.results = OrderedDict()
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.results
+
+    def get_or_compute(self, key, compute):
+        """Return the result for KEY, calling COMPUTE to find it if it is not
+        cached yet."""
+        with self.lock:
+            if key in self.results:
+                self.hits += 1
+                self.results.move_to_end(key)
+                return self.results[key]
+            self.misses += 1
+        result = compute()
+        with self.lock:
+            self.results[key] = result
+            self.results.move_to_end(key)
+            while len(self.results) > self.limit:
+                self.results.popitem(last=False)
+        return result
+
+
+RESULTS = ResultCache()
+
+
+def compare_batch(strategies, pairs, goal=hog.GOAL_SCORE, results=RESULTS):
+    """Return a list of the win rates of STRATEGIES[I] against STRATEGIES[J]
+    for each pair [I, J] in PAIRS, using and updating the ResultCache RESULTS.
+
+    Each strategy is a GOAL x GOAL table of numbers of dice, or such a table
+    encoded as JSON. Each distinct table is checked and hashed once, and each
+    distinct pair of tables is compared at most once.
+
+    >>> cache = ResultCache()
+    >>> always_4, always_6 = [[4] * 20] * 20, [[6] * 20] * 20
+    >>> rates = compare_batch([always_4, always_6, json.dumps(always_4)],
+    ...                       [[0, 1], [2, 1], [1, 0]], goal=20, results=cache)
+    >>> rates[0] == rates[1], len(cache.results), cache.misses, cache.hits
+    (True, 2, 2, 1)
+    """
+    keys, tables = [], {}
+    for strategy in strategies:
+        if isinstance(strategy, str):
+            strategy = json.loads(strategy)
+        rolls = strategy_rolls(strategy, goal)
+        key = strategy_key(hog.StrategyTable(memoryview(rolls), goal))
+        tables.setdefault(key, rolls.reshape(goal, goal))
+        keys.append(key)
+
+    def compare(key0, key1):
+        return lambda: compare_strategies(tables[key0], tables[key1], goal)
+
+    win_rates = []
+    for i, j in pairs:
+        key0, key1 = keys[i], keys[j]
+        win_rates.append(results.get_or_compute((key0, key1), compare(key0, key1)))
+    return win_rates
+
+
+@route("api/compare_strategies")
+def compare_pair(strat0, strat1, goal=hog.GOAL_SCORE, token=None):
+    """Return the win rate of STRAT0 against STRAT1, in the form returned by
+    the hog-calc server. TOKEN is accepted, and ignored, for compatibility."""
+    try:
+        win_rate, = compare_batch([strat0, strat1], [[0, 1]], goal)
+    except (AssertionError, ValueError, TypeError, IndexError) as e:
+        return {"success": False, "message": str(e)}
+    return {"success": True, "win_rate": win_rate}
+
+
+@route("api/compare_batch")
+def compare_many(strategies, pairs, goal=hog.GOAL_SCORE):
+    """Return the win rates of the PAIRS of indices into STRATEGIES, and how
+    many of them were answered from the cache.
+
+    >>> always_6 = [[6] * 100] * 100
+    >>> response = compare_many([always_6], [[0, 0], [0, 0]])
+    >>> response["success"], round(response["win_rates"][0], 6), response["cached"]
+    (True, 0.534134, 1)
+    >>> compare_many([[[11] * 100] * 100], [[0, 0]])["message"]
+    'strategy(0, 0) returned 11'
+    """
+    hits = RESULTS.hits
+    try:
+        win_rates = compare_batch(strategies, pairs, goal)
+    except (AssertionError, ValueError, TypeError, IndexError) as e:
+        return {"success": False, "message": str(e)}
+    return {"success": True, "win_rates": win_rates, "cached": RESULTS.hits - hits}
+
+
+if __name__ == "__main__":
+    app = start(PORT, DEFAULT_SERVER, GUI_FOLDER)
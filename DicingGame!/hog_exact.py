@@ -0,0 +1,772 @@
+"""Exact probability computations for the Game of Hog.
+
+Instead of estimating turn scores by calling roll_dice many times (see
+make_averaged in hog.py), the functions in this module compute the exact
+distribution of roll_dice outcomes.
+
+A die may be described either by a fair dice function from dice.py (such as
+six_sided or four_sided) or by a list of face probabilities, where the Kth
+element is the probability of rolling K + 1.
+
+Solved games can be stored in a cache directory (see save_solution), which is
+used automatically when the HOG_CACHE_DIR environment variable names one.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from dice import six_sided
+from hog import GOAL_SCORE, Rules, StrategyTable
+from ucb import main
+
+MAX_ROLLS = 10  # The most dice a player may roll in one turn.
+
+_distribution_cache = {}
+
+
+def face_probabilities(dice=six_sided):
+    """Return a tuple of the probabilities of each face of DICE, where the Kth
+    element is the probability of rolling K + 1.
+
+    >>> from dice import four_sided
+    >>> face_probabilities(four_sided)
+    (0.25, 0.25, 0.25, 0.25)
+    >>> face_probabilities([0.5, 0, 0.5])
+    (0.5, 0, 0.5)
+    """
+    if callable(dice):
+        assert hasattr(dice, 'sides'), 'Only fair dice have a known distribution.'
+        return (1 / dice.sides,) * dice.sides
+    probabilities = tuple(dice)
+    assert len(probabilities) > 0, 'A die must have at least one face.'
+    assert all(p >= 0 for p in probabilities), 'Probabilities must be non-negative.'
+    assert abs(sum(probabilities) - 1) < 1e-9, 'Probabilities must sum to 1.'
+    return probabilities
+
+
+def roll_dice_distribution(num_rolls, dice=six_sided):
+    """Return a list DIST such that DIST[K] is the probability that
+    roll_dice(NUM_ROLLS, DICE) returns K.
+
+    The distribution is computed by dynamic programming over the sum of the
+    rolls that contain no ones. Any roll sequence that contains a one scores
+    exactly 1.
+
+    >>> dist = roll_dice_distribution(1, [0.25, 0.25, 0.25, 0.25])
+    >>> dist
+    [0.0, 0.25, 0.25, 0.25, 0.25]
+    >>> dist = roll_dice_distribution(2, [0.5, 0.5])
+    >>> dist
+    [0.0, 0.75, 0.0, 0.0, 0.25]
+    >>> round(sum(roll_dice_distribution(10)), 12)
+    1.0
+    """
+    assert type(num_rolls) == int, 'num_rolls must be an integer.'
+    assert num_rolls > 0, 'Must roll at least once.'
+    probabilities = face_probabilities(dice)
+    key = (num_rolls, probabilities)
+    if key not in _distribution_cache:
+        _distribution_cache[key] = _compute_distribution(num_rolls, probabilities)
+    return list(_distribution_cache[key])
+
+
+def _compute_distribution(num_rolls, probabilities):
+    """Compute the roll_dice distribution for NUM_ROLLS dice with the given
+    face PROBABILITIES."""
+    sides = len(probabilities)
+    # no_ones[s] is the probability that the rolls so far contain no ones and
+    # sum to s.
+    no_ones = [1.0]
+    for _ in range(num_rolls):
+        next_no_ones = [0.0] * (len(no_ones) + sides)
+        for total, p_total in enumerate(no_ones):
+            if p_total:
+                for face in range(2, sides + 1):
+                    next_no_ones[total + face] += p_total * probabilities[face - 1]
+        no_ones = next_no_ones
+    dist = no_ones[:num_rolls * sides + 1]
+    dist[1] = max(0.0, 1 - sum(dist))
+    return tuple(dist)
+
+
+def roll_dice_distributions(dice=six_sided, max_rolls=MAX_ROLLS):
+    """Return a list whose Nth element is roll_dice_distribution(N, DICE) for
+    N from 1 to MAX_ROLLS. The element at index 0 is None.
+    """
+    return [None] + [roll_dice_distribution(n, dice) for n in range(1, max_rolls + 1)]
+
+
+def expected_turn_score(num_rolls, dice=six_sided):
+    """Return the exact expected value of roll_dice(NUM_ROLLS, DICE).
+
+    >>> expected_turn_score(1, [0.5, 0.5])
+    1.5
+    >>> round(expected_turn_score(6), 6)
+    8.702653
+    """
+    dist = roll_dice_distribution(num_rolls, dice)
+    return sum(k * p for k, p in enumerate(dist))
+
+
+def exact_max_scoring_num_rolls(dice=six_sided):
+    """Return the number of dice (1 to 10) that gives the highest expected turn
+    score, like max_scoring_num_rolls in hog.py but without sampling. Ties are
+    broken in favor of the lowest number of dice.
+
+    >>> exact_max_scoring_num_rolls(six_sided)
+    6
+    >>> exact_max_scoring_num_rolls([0, 1])
+    10
+    """
+    best_num_rolls, best_score = 1, expected_turn_score(1, dice)
+    for num_rolls in range(2, MAX_ROLLS + 1):
+        score = expected_turn_score(num_rolls, dice)
+        if score > best_score:
+            best_num_rolls, best_score = num_rolls, score
+    return best_num_rolls
+
+
+####################
+# Optimal Strategy #
+####################
+
+# Both the solver and compare_strategies visit states in decreasing order of
+# total score, one level (anti-diagonal) at a time, using NumPy for all the
+# states of a level at once. Instead of GOAL x GOAL tables of win rates, they
+# keep only what later levels need:
+#
+#  -  For each opponent score, the values of ending a turn at each of the next
+#     few scores, in a ring of WIDTH entries stored twice, so that the values
+#     of every outcome of a turn form one contiguous slice.
+#  -  For each score, the win rates of the last few levels, which are needed
+#     to look up the score after Hog Pile and to resolve zero-point turns.
+#
+# The points of zero-dice turns, Hog Pile and any other bonuses all come from
+# a hog.Rules, so that both functions solve the same variant of the game that
+# play and hog_batch simulate.
+#
+# Memory therefore grows with GOAL rather than GOAL x GOAL, apart from the
+# one-byte-per-state strategy table that the solver returns.
+
+RECENT = 16  # Fewest levels of win rates kept; Hog Pile adds at most 9 points.
+
+_solution_cache = {}
+_table_cache = {}
+_cache_dir = os.environ.get('HOG_CACHE_DIR')  # See use_cache_dir
+
+
+def _recent_win_rates(rules):
+    """Return an array of zeros to hold the win rates of the last levels
+    before the current one, indexed as RECENT[score, opponent_score % LEVELS],
+    with enough LEVELS for any score after the bonuses of RULES."""
+    return np.zeros((rules.goal, max(RECENT, rules.max_bonus() + 2)))
+
+
+def _outcome_matrix(probabilities):
+    """Return (WIDTH, OUTCOMES) where OUTCOMES[P - 1, N - 1] is the chance that
+    rolling N dice scores P points, for every P up to WIDTH. WIDTH also covers
+    every number of Hefty Hogs points, which are less than 30."""
+    dists = roll_dice_distributions(probabilities)
+    width = max(MAX_ROLLS * len(probabilities), 29)
+    outcomes = np.zeros((width, MAX_ROLLS))
+    for num_rolls in range(1, MAX_ROLLS + 1):
+        dist = dists[num_rolls]
+        outcomes[:len(dist) - 1, num_rolls - 1] = dist[1:]
+    return width, outcomes
+
+
+class _EndValues:
+    """For each opponent score O, the values of the current player ending a
+    turn at score E, for the WIDTH scores E above the current score."""
+
+    def __init__(self, goal, width, fill):
+        self.width = width
+        self.values = np.full((goal, 2 * width), fill, dtype=float)
+        self.view = np.lib.stride_tricks.sliding_window_view(self.values, width, axis=1)
+
+    def push(self, opponent_scores, end_scores, values):
+        """Store the value of ending at each of END_SCORES against the
+        corresponding OPPONENT_SCORES."""
+        column = end_scores % self.width
+        self.values[opponent_scores, column] = values
+        self.values[opponent_scores, column + self.width] = values
+
+    def windows(self, opponent_scores, scores):
+        """Return an array whose row I holds the values of ending at scores
+        SCORES[I] + 1 to SCORES[I] + WIDTH against OPPONENT_SCORES[I]."""
+        return self.view[opponent_scores, (scores + 1) % self.width]
+
+    def copy(self):
+        other = _EndValues(0, self.width, 0.0)
+        other.values = self.values.copy()
+        other.view = np.lib.stride_tricks.sliding_window_view(other.values, self.width, axis=1)
+        return other
+
+
+def _levels(goal):
+    """Yield (SCORES, OPPONENT_SCORES) for each level of states, in decreasing
+    order of total score, with SCORES increasing within each level."""
+    for total in range(2 * goal - 2, -1, -1):
+        yield _level(goal, total)
+
+
+def _level(goal, total):
+    """Return (SCORES, OPPONENT_SCORES) for the states with TOTAL score."""
+    scores = np.arange(max(0, total - goal + 1), min(total, goal - 1) + 1)
+    return scores, total - scores
+
+
+def solve_optimal(goal=GOAL_SCORE, dice=six_sided, tolerance=1e-12, rules=None):
+    """Return (STRATEGY, WIN_RATES), two GOAL x GOAL tables where
+    STRATEGY[score][opponent_score] is the number of dice that maximizes the
+    current player's chance of winning and WIN_RATES[score][opponent_score] is
+    that chance, assuming both players play optimally from then on.
+
+    States are solved in decreasing order of total score, since every turn
+    that scores points moves to a state with a higher total. The only turns
+    that can score no points are zero-dice turns for which Hefty Hogs gives 0
+    and Hog Pile does not apply; these pass the turn from (score,
+    opponent_score) to (opponent_score, score). Such a turn is only chosen when
+    it is better than rolling by more than TOLERANCE, and when both players
+    could pass, only the one with the lower score does, so that two optimal
+    players never pass the turn back and forth forever.
+
+    RULES, a hog.Rules, replaces GOAL, DICE and the usual scoring rules if
+    given. The tables hold GOAL x GOAL Python numbers; for large goals, use
+    optimal_strategy_table and optimal_win_rate instead.
+
+    >>> strategy, win_rates = solve_optimal()
+    >>> strategy[0][0]
+    2
+    >>> round(win_rates[0][0], 6)
+    0.516823
+    >>> strategy[99][99]
+    0
+    >>> strategy, win_rates = solve_optimal(rules=Rules(hefty_hogs=False, hog_pile=False))
+    >>> strategy[0][0], round(win_rates[0][0], 6)
+    (6, 0.53436)
+    """
+    rules = rules or Rules(goal, dice)
+    goal = rules.goal
+    strategy, win_rates, _ = _solution(rules, tolerance, keep_win_rates=True)
+    return (strategy.reshape(goal, goal).tolist(),
+            win_rates.reshape(goal, goal).tolist())
+
+
+def _solution(rules, tolerance=1e-12, keep_win_rates=False):
+    """Return the cached (STRATEGY, WIN_RATES, START_RATE) solved by
+    _solve_optimal for RULES, solving again if WIN_RATES are needed but were
+    not kept."""
+    probabilities = face_probabilities(rules.dice)
+    key = (rules.key(), probabilities, tolerance)
+    cached = _solution_cache.get(key)
+    # Rules that cannot be named are only cached in memory.
+    cache_dir = _cache_dir if solution_name(rules, tolerance) is not None else None
+    if cached is None and cache_dir is not None:
+        cached = load_solution(cache_dir, rules, tolerance)
+    if cached is None or (keep_win_rates and cached[1] is None):
+        cached = _solve_optimal(rules, probabilities, tolerance, keep_win_rates)
+        if cache_dir is not None:
+            _write_solution(cache_dir, rules, tolerance, cached)
+    _solution_cache[key] = cached
+    return cached
+
+
+def _solve_optimal(rules, probabilities, tolerance, keep_win_rates):
+    """Return (STRATEGY, WIN_RATES, START_RATE): the optimal numbers of dice
+    as a flat int8 array indexed by score * GOAL + opponent_score, the
+    matching win rates (or None unless KEEP_WIN_RATES), and the first
+    player's chance of winning from (0, 0)."""
+    goal = rules.goal
+    width, outcomes = _outcome_matrix(probabilities)
+    ends = _EndValues(goal, width, 1.0)
+    recent = _recent_win_rates(rules)
+    levels = recent.shape[1]
+    strategy = np.zeros(goal * goal, dtype=np.int8)
+    win_rates = np.zeros(goal * goal) if keep_win_rates else None
+    for scores, opponents in _levels(goal):
+        # The value of ending this turn one point higher than before
+        end = scores + 1
+        final = end + rules.bonus_array(end, opponents)
+        ended = np.ones(len(scores))
+        inside = final < goal
+        ended[inside] = 1.0 - recent[opponents[inside], final[inside] % levels]
+        ends.push(opponents, end, ended)
+
+        windows = ends.windows(opponents, scores)
+        rates = windows @ outcomes
+        num_rolls = rates.argmax(axis=1)
+        rate = rates[np.arange(len(scores)), num_rolls]
+        num_rolls += 1
+
+        # Zero dice: Hefty Hogs points, then Hog Pile and other bonuses
+        points = rules.zero_dice_points_array(scores, opponents)
+        pile = rules.bonus_array(scores, opponents)
+        zero_rate = windows[np.arange(len(scores)), np.maximum(points, 1) - 1]
+        stay = points == 0
+        final = scores + pile
+        zero_rate[stay] = 1.0
+        inside = stay & (final < goal)
+        zero_rate[inside] = 1.0 - recent[opponents[inside], final[inside] % levels]
+        zero_final = np.where(stay, final,
+                              scores + points + rules.bonus_array(scores + points, opponents))
+        wins = zero_final >= goal
+        stalled = stay & (pile == 0)
+        zero = wins | (~stalled & (zero_rate >= rate))
+        num_rolls[zero] = 0
+        rate[zero] = zero_rate[zero]
+        rate[wins] = 1.0
+
+        _resolve_stalls(scores, opponents, stalled, num_rolls, rate, tolerance)
+        recent[scores, opponents % levels] = rate
+        strategy[scores * goal + opponents] = num_rolls
+        if keep_win_rates:
+            win_rates[scores * goal + opponents] = rate
+    return strategy, win_rates, float(rate[0])
+
+
+def _resolve_stalls(scores, opponents, stalled, num_rolls, rate, tolerance):
+    """Update NUM_ROLLS and RATE for the STALLED states of a level, in which
+    rolling zero dice scores no points and passes the turn to the partner
+    state (opponent_score, score) in the same level."""
+    partner = opponents - scores[0]
+    # Passing to a partner who will not pass back
+    alone = np.flatnonzero(stalled & ~stalled[partner])
+    pass_rate = 1.0 - rate[partner[alone]]
+    passes = alone[pass_rate > rate[alone] + tolerance]
+    num_rolls[passes] = 0
+    rate[passes] = 1.0 - rate[partner[passes]]
+    # Both could pass: the player with the lower score passes if it helps,
+    # and otherwise the other player may.
+    first = np.flatnonzero(stalled & stalled[partner] & (scores < opponents))
+    second = partner[first]
+    first_rate, second_rate = rate[first], rate[second]
+    first_passes = 1.0 - second_rate > first_rate + tolerance
+    second_passes = ~first_passes & (1.0 - first_rate > second_rate + tolerance)
+    num_rolls[first[first_passes]] = 0
+    rate[first[first_passes]] = 1.0 - second_rate[first_passes]
+    num_rolls[second[second_passes]] = 0
+    rate[second[second_passes]] = 1.0 - first_rate[second_passes]
+
+
+def optimal_strategy(goal=GOAL_SCORE, dice=six_sided, rules=None):
+    """Return a strategy function that plays optimally, as computed by
+    solve_optimal(GOAL, DICE, rules=RULES).
+
+    >>> optimal_strategy()(0, 0)
+    2
+    """
+    strategy = optimal_strategy_table(goal, dice, rules)
+
+    def strategy_function(score, opponent_score):
+        return strategy[score][opponent_score]
+    return strategy_function
+
+
+def optimal_strategy_table(goal=GOAL_SCORE, dice=six_sided, rules=None):
+    """Return the cached StrategyTable of optimal numbers of dice, as computed
+    by solve_optimal(GOAL, DICE, rules=RULES), without keeping every win rate.
+    The result must not be modified.
+
+    >>> optimal_strategy_table()[0][0]
+    2
+    >>> optimal_strategy_table(1000)(0, 0)
+    2
+    """
+    rules = rules or Rules(goal, dice)
+    key = (rules.key(), face_probabilities(rules.dice))
+    if key not in _table_cache:
+        strategy = _solution(rules)[0]
+        _table_cache[key] = StrategyTable(memoryview(strategy), rules.goal)
+    return _table_cache[key]
+
+
+def optimal_win_rate(goal=GOAL_SCORE, dice=six_sided, rules=None):
+    """Return the chance that the first player wins when both players play
+    optimally, as computed by solve_optimal(GOAL, DICE, rules=RULES).
+
+    >>> round(optimal_win_rate(), 6)
+    0.516823
+    """
+    return _solution(rules or Rules(goal, dice))[2]
+
+
+#################
+# On-Disk Cache #
+#################
+
+# A solution is stored as three files that share a name derived from its rules,
+# dice and tolerance: NAME.strategy.npy and NAME.win_rates.npy hold the int8
+# strategy and float64 win rates indexed by score * goal + opponent_score, and
+# NAME.json, written last, describes them. Arrays are loaded with mmap, so
+# every process that loads a solution shares one copy of it in memory.
+
+def use_cache_dir(cache_dir):
+    """Load solutions from CACHE_DIR, and save new ones to it, from now on.
+    A CACHE_DIR of None turns the cache off. Rules whose bonuses cannot be
+    named (see solution_name) are solved without the cache.
+
+    >>> import tempfile
+    >>> unnamed = Rules(goal=30, bonuses=[lambda score, opponent: score % 2])
+    >>> expected = optimal_win_rate(rules=unnamed)
+    >>> previous = _cache_dir
+    >>> with tempfile.TemporaryDirectory() as cache_dir:
+    ...     use_cache_dir(cache_dir)
+    ...     _solution_cache.clear()
+    ...     try:
+    ...         rates = (optimal_win_rate(rules=unnamed),
+    ...                  compare_strategies(optimal_strategy_table(rules=unnamed),
+    ...                                     optimal_strategy_table(rules=unnamed),
+    ...                                     rules=unnamed))
+    ...         saved = os.listdir(cache_dir)
+    ...     finally:
+    ...         use_cache_dir(previous)
+    >>> rates[0] == expected, round(rates[1] - expected, 12), saved
+    (True, 0.0, [])
+    """
+    global _cache_dir
+    _cache_dir = cache_dir
+
+
+def solution_name(rules, tolerance=1e-12):
+    """Return the name shared by the files of the solution of RULES, or None
+    if RULES have a bonus that is not a named, module-level function, since
+    such a bonus cannot be told apart from another one.
+
+    >>> solution_name(Rules()) == solution_name(Rules(dice=[1 / 6] * 6))
+    True
+    >>> solution_name(Rules()) == solution_name(Rules(hog_pile=False))
+    False
+    >>> print(solution_name(Rules(bonuses=[lambda score, opponent: 1])))
+    None
+    """
+    bonuses = []
+    for bonus in rules.bonuses:
+        name = '{}.{}'.format(bonus.__module__, bonus.__qualname__)
+        if '<' in name:
+            return None
+        bonuses.append(name)
+    description = [rules.goal, rules.hefty_hogs, rules.hog_pile, bonuses,
+                   face_probabilities(rules.dice), tolerance]
+    digest = hashlib.sha256(json.dumps(description).encode()).hexdigest()
+    return 'hog-{}-{}'.format(rules.goal, digest[:16])
+
+
+def save_solution(cache_dir, rules=None, tolerance=1e-12, win_rates=True):
+    """Solve RULES (by default, the usual rules of Hog) and save the optimal
+    strategy, and its WIN_RATES unless that is false, to CACHE_DIR.
+
+    >>> import tempfile
+    >>> rules = Rules(goal=30)
+    >>> with tempfile.TemporaryDirectory() as cache_dir:
+    ...     save_solution(cache_dir, rules)
+    ...     strategy, win_rates, start_rate = load_solution(cache_dir, rules)
+    ...     solved = _solve_optimal(rules, face_probabilities(six_sided), 1e-12, True)
+    ...     same = (bool((strategy == solved[0]).all()), bool((win_rates == solved[1]).all()),
+    ...             start_rate == solved[2], type(strategy).__name__)
+    ...     missing = load_solution(cache_dir, Rules(goal=31))
+    >>> same, missing
+    ((True, True, True, 'memmap'), None)
+    """
+    rules = rules or Rules()
+    assert solution_name(rules, tolerance) is not None, \
+        'Only rules with named, module-level bonuses can be saved.'
+    _write_solution(cache_dir, rules, tolerance,
+                    _solution(rules, tolerance, keep_win_rates=win_rates))
+
+
+def load_solution(cache_dir, rules=None, tolerance=1e-12):
+    """Return (STRATEGY, WIN_RATES, START_RATE), the solution of RULES stored
+    in CACHE_DIR as memory-mapped, read-only arrays, or None if there is none.
+    WIN_RATES is None if they were not saved."""
+    rules = rules or Rules()
+    name = solution_name(rules, tolerance)
+    if name is None:
+        return None
+    path = os.path.join(cache_dir, name)
+    try:
+        with open(path + '.json') as f:
+            info = json.load(f)
+    except FileNotFoundError:
+        return None
+    strategy = np.load(path + '.strategy.npy', mmap_mode='r')
+    win_rates = None
+    if info['win_rates']:
+        win_rates = np.load(path + '.win_rates.npy', mmap_mode='r')
+    return strategy, win_rates, info['start_rate']
+
+
+def _write_solution(cache_dir, rules, tolerance, solution):
+    """Atomically write each file of SOLUTION for RULES to CACHE_DIR."""
+    strategy, win_rates, start_rate = solution
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, solution_name(rules, tolerance))
+    _replace(path + '.strategy.npy', lambda f: np.save(f, np.asarray(strategy)))
+    if win_rates is not None:
+        _replace(path + '.win_rates.npy', lambda f: np.save(f, np.asarray(win_rates)))
+    info = {'goal': rules.goal, 'rules': repr(rules), 'start_rate': start_rate,
+            'win_rates': win_rates is not None}
+    _replace(path + '.json', lambda f: f.write(json.dumps(info).encode()))
+
+
+def _replace(path, write):
+    """Replace the file at PATH with one written by calling WRITE on a new
+    binary file, so that readers never see a partly written file."""
+    with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(os.path.abspath(path)),
+                                     suffix='.tmp', delete=False) as f:
+        write(f)
+    try:
+        os.chmod(f.name, 0o644)  # Readable by every process that shares the cache
+        os.replace(f.name, path)
+    except OSError:
+        os.remove(f.name)
+        raise
+
+
+########################
+# Strategy Comparisons #
+########################
+
+def compare_strategies(strat0_table, strat1_table, goal=GOAL_SCORE, dice=six_sided,
+                       rules=None):
+    """Return the exact probability that Player 0 wins a game that starts at
+    (0, 0) when Player 0 plays STRAT0_TABLE and Player 1 plays STRAT1_TABLE.
+
+    Each table is a StrategyTable or a table indexed as
+    TABLE[score][opponent_score], like the tables produced by calc.export.
+    Games in which both players forever roll zero dice for zero points never
+    end, and are counted as losses for Player 0. RULES, a hog.Rules, replaces
+    GOAL, DICE and the usual scoring rules if given.
+
+    >>> six = [[6] * 100] * 100
+    >>> round(compare_strategies(six, six), 6)
+    0.534134
+    >>> optimal = optimal_strategy_table()
+    >>> round(compare_strategies(optimal, optimal), 6)
+    0.516823
+    >>> variant = Rules(goal=50, bonuses=[lambda score, opponent: 2 * (score % 3 == 0)])
+    >>> round(compare_strategies(optimal_strategy_table(rules=variant),
+    ...                          optimal_strategy_table(rules=variant), rules=variant)
+    ...       - optimal_win_rate(rules=variant), 12)
+    0.0
+    """
+    rules = rules or Rules(goal, dice)
+    goal = rules.goal
+    rolls0, rolls1 = strategy_rolls(strat0_table, goal), strategy_rolls(strat1_table, goal)
+    state = _Comparison(rules)
+    for total in range(2 * goal - 2, -1, -1):
+        state.solve_level(total, rolls0, rolls1)
+    return state.start_rate
+
+
+class _Comparison:
+    """The values computed by compare_strategies for the levels solved so
+    far, from which the next lower level can be solved."""
+
+    def __init__(self, rules):
+        self.rules = rules
+        goal = rules.goal
+        width, outcomes = _outcome_matrix(face_probabilities(rules.dice))
+        self.turn_outcomes = np.vstack([np.zeros(width), outcomes.T])  # Indexed by num_rolls
+        # Player 0's chance of winning after each player ends a turn
+        self.ends0 = _EndValues(goal, width, 1.0)  # Rows by score1
+        self.ends1 = _EndValues(goal, width, 0.0)  # Rows by score0
+        # Player 0's chance of winning when Player 0 (recent0) or Player 1
+        # (recent1) is about to take a turn, as recent0[score0, score1 % LEVELS]
+        # and recent1[score1, score0 % LEVELS].
+        self.recent0, self.recent1 = _recent_win_rates(rules), _recent_win_rates(rules)
+        self.start_rate = None  # Set once level 0 is solved
+
+    def copy(self):
+        other = _Comparison.__new__(_Comparison)
+        other.__dict__.update(self.__dict__)
+        other.ends0, other.ends1 = self.ends0.copy(), self.ends1.copy()
+        other.recent0, other.recent1 = self.recent0.copy(), self.recent1.copy()
+        return other
+
+    def solve_level(self, total, rolls0, rolls1):
+        """Solve the states with TOTAL score, where the flat arrays ROLLS0 and
+        ROLLS1 are the numbers of dice of each player, as returned by
+        strategy_rolls."""
+        rules, goal = self.rules, self.rules.goal
+        ends0, ends1, recent0, recent1 = self.ends0, self.ends1, self.recent0, self.recent1
+        levels = recent0.shape[1]
+        score0, score1 = _level(goal, total)
+        _push_end_values(ends0, score1, score0, recent1, rules, 1.0)
+        _push_end_values(ends1, score0, score1, recent0, rules, 0.0)
+        rate0, passes0 = _turn_win_rates(rolls0[score0 * goal + score1], ends0, score0, score1,
+                                         self.turn_outcomes, recent1, rules, 1.0)
+        rate1, passes1 = _turn_win_rates(rolls1[score1 * goal + score0], ends1, score1, score0,
+                                         self.turn_outcomes, recent0, rules, 0.0)
+        # A turn that scores no points passes the turn back unchanged.
+        rate0[passes0] = rate1[passes0]
+        rate1[passes1] = rate0[passes1]
+        both_pass = passes0 & passes1
+        rate0[both_pass] = rate1[both_pass] = 0.0
+        recent0[score0, score1 % levels] = rate0
+        recent1[score1, score0 % levels] = rate1
+        if total == 0:
+            self.start_rate = float(rate0[0])
+
+
+class IncrementalComparison:
+    """Exact win rates of many strategy tables, each playing in SEAT (0 or 1)
+    against the fixed OPPONENT table, computed like compare_strategies but
+    reusing work between tables that differ in only some states.
+
+    The state of the computation is saved after every CHECKPOINT_EVERY levels
+    of total score. No state can reach a state with a lower total score, so
+    if a table differs from the previous one only in states with totals up to
+    D, every level above D is unchanged, and the computation resumes from the
+    lowest checkpoint above D.
+
+    >>> six = [[6] * 100] * 100
+    >>> comparison = IncrementalComparison(six, seat=0)
+    >>> round(comparison.win_rate(six), 6), comparison.levels_solved
+    (0.534134, 199)
+    >>> early = [[4 if score + opponent_score < 20 else 6 for opponent_score in range(100)]
+    ...          for score in range(100)]
+    >>> comparison.win_rate(early) == compare_strategies(early, six), comparison.levels_solved
+    (True, 223)
+    >>> seat1 = IncrementalComparison(six, seat=1)
+    >>> seat1.win_rate(early) == 1 - compare_strategies(six, early)
+    True
+    """
+
+    def __init__(self, opponent, seat=1, goal=GOAL_SCORE, dice=six_sided, rules=None,
+                 checkpoint_every=None):
+        assert seat in (0, 1), 'The seat must be 0 or 1.'
+        self.rules = rules or Rules(goal, dice)
+        self.goal = self.rules.goal
+        self.opponent = strategy_rolls(opponent, self.goal)
+        self.seat = seat
+        self.every = checkpoint_every or max(1, self.goal // 16)
+        self.checkpoints = {}  # Saved states by the last total solved
+        self.last_rolls = self.last_rate = None
+        self.levels_solved = 0
+
+    def win_rate(self, table):
+        """Return the chance that the player in SEAT wins playing TABLE."""
+        goal = self.goal
+        rolls = strategy_rolls(table, goal)
+        highest = 2 * goal - 2  # The highest total of a changed state
+        if self.last_rolls is not None:
+            changed = np.flatnonzero(rolls != self.last_rolls)
+            if not len(changed):
+                return self.last_rate
+            highest = int((changed // goal + changed % goal).max())
+        self.checkpoints = {total: state for total, state in self.checkpoints.items()
+                            if total > highest}
+        if self.checkpoints:
+            resume = min(self.checkpoints)
+            state = self.checkpoints[resume].copy()
+        else:
+            resume, state = 2 * goal - 1, _Comparison(self.rules)
+        rolls0, rolls1 = (rolls, self.opponent) if self.seat == 0 else (self.opponent, rolls)
+        for total in range(resume - 1, -1, -1):
+            state.solve_level(total, rolls0, rolls1)
+            self.levels_solved += 1
+            if total and total % self.every == 0:
+                self.checkpoints[total] = state.copy()
+        rate = state.start_rate if self.seat == 0 else 1.0 - state.start_rate
+        self.last_rolls, self.last_rate = rolls, rate
+        return rate
+
+
+def _push_end_values(ends, opponents, scores, recent, rules, goal_rate):
+    """Store Player 0's chance of winning when the current player ends a turn
+    one point above SCORES, given the RECENT win rates of the other player's
+    turns, or GOAL_RATE if the current player reaches the goal of RULES."""
+    end = scores + 1
+    final = end + rules.bonus_array(end, opponents)
+    values = np.full(len(scores), goal_rate)
+    inside = final < rules.goal
+    values[inside] = recent[opponents[inside], final[inside] % recent.shape[1]]
+    ends.push(opponents, end, values)
+
+
+def _turn_win_rates(num_rolls, ends, scores, opponents, turn_outcomes, recent, rules,
+                    goal_rate):
+    """Return (RATES, PASSES): Player 0's chance of winning when the current
+    players roll NUM_ROLLS dice from SCORES against OPPONENTS, and whether
+    each turn scores no points, in which case its rate is not set."""
+    windows = ends.windows(opponents, scores)
+    rates = np.einsum('ij,ij->i', windows, turn_outcomes[num_rolls])
+    zero = np.flatnonzero(num_rolls == 0)
+    points = rules.zero_dice_points_array(scores[zero], opponents[zero])
+    moved = points > 0
+    rates[zero[moved]] = windows[zero[moved], points[moved] - 1]
+    stay = zero[~moved]
+    pile = rules.bonus_array(scores[stay], opponents[stay])
+    final = scores[stay] + pile
+    stay_rates = np.full(len(stay), goal_rate)
+    inside = final < rules.goal
+    stay_rates[inside] = recent[opponents[stay][inside], final[inside] % recent.shape[1]]
+    rates[stay] = stay_rates
+    passes = np.zeros(len(scores), dtype=bool)
+    passes[stay[pile == 0]] = True
+    return rates, passes
+
+
+def strategy_rolls(table, goal):
+    """Return the numbers of dice in TABLE for all scores below GOAL as a flat
+    int8 array indexed by score * GOAL + opponent_score, checking that each
+    one is an integer from 0 to MAX_ROLLS.
+
+    >>> strategy_rolls([[1, 2], [3, 4]], 2).tolist()
+    [1, 2, 3, 4]
+    >>> strategy_rolls([[1, 2], [3, 11]], 2)
+    Traceback (most recent call last):
+     ...
+    AssertionError: strategy(1, 1) returned 11
+    """
+    if isinstance(table, StrategyTable):
+        assert table.goal >= goal, 'Strategy tables must have a row for every score.'
+        rolls = np.frombuffer(table.rolls_array(), dtype=np.int8)
+        return rolls.reshape(table.goal, table.goal)[:goal, :goal].ravel()
+    if isinstance(table, np.ndarray) and table.dtype.kind in 'iu':
+        rolls = table[:goal, :goal]
+        assert rolls.shape == (goal, goal), 'Strategy tables must be GOAL x GOAL.'
+        invalid = np.argwhere((rolls < 0) | (rolls > MAX_ROLLS))
+        if len(invalid):
+            score, opponent_score = invalid[0]
+            raise AssertionError('strategy({}, {}) returned {}'.format(
+                score, opponent_score, rolls[score, opponent_score]))
+        return rolls.astype(np.int8).ravel()
+    assert len(table) >= goal, 'Strategy tables must have a row for every score.'
+    rows = [table[score] for score in range(goal)]
+    assert all(len(row) >= goal for row in rows), \
+        'Strategy tables must have a column for every score.'
+    rolls = np.array([row[:goal] for row in rows], dtype=object)
+    valid = np.vectorize(lambda n: type(n) == int and 0 <= n <= MAX_ROLLS, otypes=[bool])
+    invalid = np.argwhere(~valid(rolls))
+    if len(invalid):
+        score, opponent_score = invalid[0]
+        raise AssertionError('strategy({}, {}) returned {}'.format(
+            score, opponent_score, rolls[score, opponent_score]))
+    return rolls.astype(np.int8).ravel()
+
+
+@main
+def run(*args):
+    """Solve the game for each goal and save the solutions to a cache
+    directory, to be loaded by setting HOG_CACHE_DIR."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Cache optimal Hog strategies")
+    parser.add_argument('cache_dir', help='Directory that holds the solutions')
+    parser.add_argument('--goals', '-g', type=int, nargs='+', default=[GOAL_SCORE],
+                        help='Goal scores to solve')
+    parser.add_argument('--no_hog_pile', action='store_true',
+                        help='Solve the game without Hog Pile')
+    parser.add_argument('--no_win_rates', action='store_true',
+                        help='Save only the strategies')
+    args = parser.parse_args()
+
+    for goal in args.goals:
+        rules = Rules(goal, hog_pile=not args.no_hog_pile)
+        save_solution(args.cache_dir, rules, win_rates=not args.no_win_rates)
+        print('Saved', solution_name(rules), 'to', args.cache_dir)
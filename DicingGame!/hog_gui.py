@@ -1,12 +1,20 @@
 """Web server for the hog GUI."""
+import functools
+import hashlib
 import io
+import json
 import os
 import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from contextlib import redirect_stdout
 
 from gui_files.common_server import route, start
 
 import hog
+import hog_trace
 import dice
 import default_graphics
 
@@ -15,83 +23,275 @@ DEFAULT_SERVER = "https://hog.cs61a.org"
 GUI_FOLDER = "gui_files/"
 PATHS = {}
 
+SESSION_LIMIT = 1000  # Most games whose state is kept between requests
+SESSION_TTL = 30 * 60  # Seconds before an idle game's state is discarded
+
 
 class HogLoggingException(Exception):
     pass
 
 
-@route
-def take_turn(prev_rolls, move_history, goal, game_rules):
-    """Simulate the whole game up to the current turn."""
-    fair_dice = dice.make_fair_dice(6)
-    dice_results = []
+class GameSession:
+    """The live state of one GUI game, advanced one turn at a time.
 
-    hog_pile = game_rules["Hog Pile"]
+    >>> session = GameSession(goal=20, hog_pile=True)
+    >>> session.advance(2, dice.make_test_dice(4, 5))
+    >>> session.result()["finalScores"], session.result()["who"]
+    ((9, 0), 1)
+    >>> print(session.message)
+    Player 0 now has 9 and now Player 1 has 0
+    Player 0 takes the lead by 9
+    >>> session.advance(3, dice.make_test_dice(3))
+    >>> session.scores, session.rolls, session.moves
+    ([9, 18], [4, 5, 3, 3, 3], [2, 3])
+    """
 
-    try:
-        old_hog_pile = hog.hog_pile
-        if not hog_pile:
-            hog.hog_pile = lambda score0, score1: 0
+    def __init__(self, goal, hog_pile):
+        self.goal = goal
+        self.hog_pile = hog_pile
+        self.rules = session_rules(goal, hog_pile)
+        self.commentary = hog.commentary(hog.say_scores, hog.announce_lead_changes,
+                                         lazy=True)
+        self.scores = [0, 0]
+        self.who = 0  # The player about to take a turn
+        self.last_player = 0  # The player who took the last turn
+        self.leader = None
+        self.message = None
+        self.rolls = []
+        self.moves = []
+        self.last_used = time.time()
+
+    def game_over(self):
+        return max(self.scores) >= self.goal
 
+    def matches(self, goal, hog_pile, prev_rolls, move_history):
+        """Return whether this session is the state reached by playing a prefix
+        of MOVE_HISTORY with exactly PREV_ROLLS under the given rules."""
+        return (self.goal == goal and self.hog_pile == hog_pile
+                and self.rolls == prev_rolls
+                and self.moves == move_history[:len(self.moves)])
+
+    def advance(self, num_rolls, dice):
+        """Take a turn for the current player, rolling NUM_ROLLS of DICE, and
+        update the scores and commentary the way hog.play does."""
         def logged_dice():
-            if len(dice_results) < len(prev_rolls):
-                out = prev_rolls[len(dice_results)]
-            else:
-                out = fair_dice()
-            dice_results.append(out)
+            out = dice()
+            self.rolls.append(out)
             return out
 
-        final_scores = None
-        final_message = None
-        who = 0
-
-        commentary = hog.both(
-            hog.say_scores,
-            hog.announce_lead_changes,
-        )
-
-        def log(*logged_scores):
-            nonlocal final_message
-            leader, message = commentary(*logged_scores)
-            final_message = message
-            return leader, message
-
-        move_cnt = 0
-
-        def strategy_for(player):
-            def strategy(*scores):
-                nonlocal final_scores, move_cnt, who
-                final_scores = scores
-                if player:
-                    final_scores = final_scores[::-1]
-                who = player
-                if move_cnt == len(move_history):
-                    raise HogLoggingException()
-                move = move_history[move_cnt]
-                move_cnt += 1
-                return move
-
-            return strategy
-
-        game_over = False
-
-        try:
-            final_scores = trace_play(
-                hog.play,
-                strategy_for(0),
-                strategy_for(1),
-                0,
-                0,
-                dice=logged_dice,
-                say=log,
-                goal=goal,
-            )[:2]
-        except HogLoggingException:
-            pass
+        who = self.who
+        self.scores[who] = self.rules.player_turn(num_rolls, self.scores[who],
+                                                  self.scores[1 - who], logged_dice)
+        self.last_player, self.who = who, hog.next_player(who)
+        self.leader, self.message = self.commentary(*self.scores, self.leader)
+        self.moves.append(num_rolls)
+
+    def fingerprint(self):
+        """Return a key that identifies this game's rules, rolls and moves."""
+        return session_fingerprint(self.goal, self.hog_pile, self.rolls, self.moves)
+
+    def result(self):
+        """Return the response to a take_turn request for the current state."""
+        game_over = self.game_over()
+        message = self.message
+        if isinstance(message, hog.LazyMessage):
+            message = message.resolve()
+        return {
+            "rolls": list(self.rolls),
+            "finalScores": tuple(self.scores),
+            "message": message,
+            "gameOver": game_over,
+            "who": self.last_player if game_over else self.who,
+        }
+
+
+def session_rules(goal, hog_pile):
+    """Return the hog.Rules of a GUI game to GOAL, with or without Hog Pile.
+    Games with the same rules share their compiled tables.
+
+    >>> session_rules(40, False).tables() is session_rules(40, False).tables()
+    True
+    """
+    return hog.Rules(goal, hog_pile=hog_pile)
+
+
+def session_fingerprint(goal, hog_pile, rolls, moves):
+    """Return a key for the game state reached with ROLLS and MOVES."""
+    state = json.dumps([goal, hog_pile, rolls, moves])
+    return hashlib.sha1(state.encode()).hexdigest()
+
+
+class SessionStore:
+    """GameSessions keyed by game id, evicting the least recently used games
+    beyond LIMIT and any game left idle for longer than TTL seconds. Sessions
+    can also be found by their fingerprint, for clients that do not send
+    back their game id.
+    """
+
+    def __init__(self, limit=SESSION_LIMIT, ttl=SESSION_TTL):
+        self.limit = limit
+        self.ttl = ttl
+        self.sessions = OrderedDict()
+        self.ids = {}  # Game ids by session fingerprint
+        self.lock = threading.Lock()
+
+    def find(self, fingerprint):
+        """Return the id of the game whose state has FINGERPRINT, or None."""
+        with self.lock:
+            return self.ids.get(fingerprint)
+
+    def pop(self, game_id):
+        """Remove and return the session for GAME_ID, or None if there is none."""
+        with self.lock:
+            self._evict_expired()
+            session = self.sessions.pop(game_id, None)
+            if session is not None:
+                self.ids.pop(session.fingerprint(), None)
+            return session
+
+    def put(self, game_id, session):
+        with self.lock:
+            session.last_used = time.time()
+            self.sessions[game_id] = session
+            self.sessions.move_to_end(game_id)
+            self.ids[session.fingerprint()] = game_id
+            while len(self.sessions) > self.limit:
+                self._discard_oldest()
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.ttl
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if oldest.last_used >= cutoff:
+                break
+            self._discard_oldest()
+
+    def _discard_oldest(self):
+        _, session = self.sessions.popitem(last=False)
+        self.ids.pop(session.fingerprint(), None)
+
+
+SESSIONS = SessionStore()
+
+
+@route
+def take_turn(prev_rolls, move_history, goal, game_rules, game_id=None):
+    """Play the moves in MOVE_HISTORY that have not been played yet, and
+    return the new state of the game along with its "gameId".
+
+    The state of each game is kept on the server, so each request only plays
+    the new move. A request is matched to its game by GAME_ID if the client
+    sends one, and otherwise by the rolls and moves it has already seen. If no
+    stored game matches the request, the game is replayed from PREV_ROLLS and
+    MOVE_HISTORY and stored again.
+
+    >>> import random
+    >>> def matches_replay(seed, goal=40, rules={"Hog Pile": True}):
+    ...     moves, rolls = [], []
+    ...     rng = random.Random(seed)
+    ...     while True:
+    ...         moves.append(rng.randrange(1, 11))
+    ...         random.seed(seed + len(moves))
+    ...         expected = replay_turns(rolls, moves, goal, rules)
+    ...         random.seed(seed + len(moves))
+    ...         actual = take_turn(rolls, moves, goal, rules)
+    ...         del actual["gameId"]
+    ...         if expected != actual:
+    ...             return False
+    ...         if actual["gameOver"]:
+    ...             return True
+    ...         rolls = actual["rolls"]
+    >>> all(matches_replay(seed) for seed in range(20))
+    True
+    >>> all(matches_replay(seed, rules={"Hog Pile": False}) for seed in range(20))
+    True
+    """
+    hog_pile = game_rules["Hog Pile"]
+    if game_id is None:
+        game_id = SESSIONS.find(session_fingerprint(goal, hog_pile, prev_rolls,
+                                                    move_history[:-1]))
+    session = SESSIONS.pop(game_id) if game_id else None
+    if session is None or not session.matches(goal, hog_pile, prev_rolls, move_history):
+        session = GameSession(goal, hog_pile)
+    if game_id is None:
+        game_id = uuid.uuid4().hex
+    fair_dice = dice.make_fair_dice(6)
+
+    def replayed_dice():
+        if len(session.rolls) < len(prev_rolls):
+            return prev_rolls[len(session.rolls)]
+        return fair_dice()
+
+    while len(session.moves) < len(move_history) and not session.game_over():
+        session.advance(move_history[len(session.moves)], replayed_dice)
+    SESSIONS.put(game_id, session)
+    return dict(session.result(), gameId=game_id)
+
+
+def replay_turns(prev_rolls, move_history, goal, game_rules):
+    """Simulate the whole game up to the current turn with hog.play."""
+    fair_dice = dice.make_fair_dice(6)
+    dice_results = []
+
+    rules = session_rules(goal, game_rules["Hog Pile"])
+
+    def logged_dice():
+        if len(dice_results) < len(prev_rolls):
+            out = prev_rolls[len(dice_results)]
         else:
-            game_over = True
-    finally:
-        hog.hog_pile = old_hog_pile
+            out = fair_dice()
+        dice_results.append(out)
+        return out
+
+    final_scores = None
+    final_message = None
+    who = 0
+
+    commentary = hog.both(
+        hog.say_scores,
+        hog.announce_lead_changes,
+    )
+
+    def log(*logged_scores):
+        nonlocal final_message
+        leader, message = commentary(*logged_scores)
+        final_message = message
+        return leader, message
+
+    move_cnt = 0
+
+    def strategy_for(player):
+        def strategy(*scores):
+            nonlocal final_scores, move_cnt, who
+            final_scores = scores
+            if player:
+                final_scores = final_scores[::-1]
+            who = player
+            if move_cnt == len(move_history):
+                raise HogLoggingException()
+            move = move_history[move_cnt]
+            move_cnt += 1
+            return move
+
+        return strategy
+
+    game_over = False
+
+    try:
+        final_scores = trace_play(
+            functools.partial(hog.play, rules=rules),
+            strategy_for(0),
+            strategy_for(1),
+            0,
+            0,
+            dice=logged_dice,
+            say=log,
+            goal=goal,
+        )[:2]
+    except HogLoggingException:
+        pass
+    else:
+        game_over = True
 
     return {
         "rolls": dice_results,
@@ -127,55 +327,17 @@ def draw_dice_graphic(num, no_default=False):
 
 
 def trace_play(play, strategy0, strategy1, score0, score1, dice, goal, say):
-    """Wraps the user's play function and
-        (1) ensures that strategy0 and strategy1 are called exactly once per turn
-        (2) records the entire game, returning the result as a list of dictionaries,
-            each with keys "s0_start", "s1_start", "who", "num_dice", "dice_values"
-    Returns (s0, s1, trace) where s0, s1 are the return values from play and trace
-        is the trace as specified above.
-    This might seem a bit overcomplicated but it will also used to create the game
-        traces for the fuzz test (when run against the staff solution).
-    """
-    game_trace = []
-
-    def mod_strategy(who, my_score, opponent_score):
-        if game_trace:
-            prev_total_score = game_trace[-1]["s0_start"] + game_trace[-1]["s1_start"]
-            if prev_total_score == my_score + opponent_score:
-                # game is still on last turn since the total number of points
-                # goes up every turn
-                return game_trace[-1]["num_dice"]
-        current_num_dice = (strategy0, strategy1)[who](my_score, opponent_score)
-        current_turn = {
-            "s0_start": [my_score, opponent_score][who],
-            "s1_start": [my_score, opponent_score][1 - who],
-            "who": who,
-            "num_dice": current_num_dice,
-            "dice_values": [],  # no dice rolled yet
-        }
-        game_trace.append(current_turn)
-        return current_num_dice
-
-    def mod_dice():
-        roll = dice()
-        if not game_trace:
-            raise RuntimeError("roll_dice called before either strategy function")
-        game_trace[-1]["dice_values"].append(roll)
-        return roll
-
+    """Play a game with hog_trace.trace_play, discarding anything PLAY prints,
+    and return (S0, S1, TRACE) where TRACE is a hog_trace.GameTrace."""
     f = io.StringIO()
     with redirect_stdout(f):
-        s0, s1 = play(
-            lambda a, b: mod_strategy(0, a, b),
-            lambda a, b: mod_strategy(1, a, b),
-            score0,
-            score1,
-            dice=mod_dice,
-            goal=goal,
-            say=say,
-        )
-    return s0, s1, game_trace
+        return hog_trace.trace_play(play, strategy0, strategy1, score0, score1,
+                                    dice, goal, say)
 
 
 if __name__ == "__main__" or "gunicorn" in os.environ.get("SERVER_SOFTWARE", ""):
+    if os.environ.get("HOG_CACHE_DIR"):
+        # Map the solved final_strategy from the shared cache before serving.
+        import hog_exact
+        hog_exact.optimal_strategy_table()
     app = start(PORT, DEFAULT_SERVER, GUI_FOLDER)
@@ -0,0 +1,144 @@
+"""Sweep the parameters of Hog strategies and rank the results.
+
+hefty_hogs_strategy and hog_pile_strategy take THRESHOLD and NUM_ROLLS
+parameters. A sweep evaluates a strategy for every pair of parameters in a
+grid, against a baseline strategy and averaged over both seats, like
+hog.average_win_rate. Win rates are computed either exactly, with one
+hog_exact.IncrementalComparison per seat, or by simulating games in batches
+with hog_batch.
+
+Exact sweeps reuse work between grid points: identical tables are only
+evaluated once, and a table that differs from the previous one only early in
+the game resumes from the levels of the game that did not change.
+"""
+
+import json
+
+import hog
+from hog_batch import win_rate_batch
+from hog_exact import IncrementalComparison
+from ucb import main
+
+STRATEGIES = {
+    'hefty_hogs_strategy': hog.hefty_hogs_strategy,
+    'hog_pile_strategy': hog.hog_pile_strategy,
+}
+
+
+def parameter_table(strategy, threshold, num_rolls, goal=hog.GOAL_SCORE):
+    """Return the StrategyTable of STRATEGY with THRESHOLD and NUM_ROLLS.
+
+    >>> parameter_table(hog.hefty_hogs_strategy, 8, 4)(0, 0)
+    4
+    """
+    def parameterized(score, opponent_score):
+        return strategy(score, opponent_score, threshold, num_rolls)
+    return hog.compile_strategy(parameterized, goal)
+
+
+def sweep(strategy, thresholds, num_rolls_values, baseline=hog.always_roll(6),
+          method='exact', rules=None, n_games=100000, seed=0):
+    """Return a dictionary of the win rates of STRATEGY against BASELINE, keyed
+    by (THRESHOLD, NUM_ROLLS) for every pair from THRESHOLDS and
+    NUM_ROLLS_VALUES, under RULES (by default, the usual rules of Hog).
+
+    METHOD is 'exact' for exact win rates, or 'batch' to simulate N_GAMES
+    games in each seat. Simulated grid points all use the same dice, drawn
+    with SEED, so that differences between them are not due to luck.
+
+    >>> rates = sweep(hog.hefty_hogs_strategy, [8, 10], [4, 6])
+    >>> round(rates[(10, 6)], 6)
+    0.777453
+    >>> simulated = sweep(hog.hefty_hogs_strategy, [8, 10], [4, 6], method='batch')
+    >>> all(abs(simulated[point] - rates[point]) < 0.01 for point in rates)
+    True
+    """
+    assert method in ('exact', 'batch'), 'The method must be exact or batch.'
+    rules = rules or hog.Rules()
+    baseline = hog.compile_strategy(baseline, rules.goal)
+    if method == 'exact':
+        seats = [IncrementalComparison(baseline, seat, rules=rules) for seat in (0, 1)]
+    rates, evaluated = {}, {}  # Win rates by point, and by table contents
+    for num_rolls in num_rolls_values:
+        for threshold in thresholds:
+            table = parameter_table(strategy, threshold, num_rolls, rules.goal)
+            key = table.rolls_array().tobytes()
+            if key not in evaluated:
+                if method == 'exact':
+                    first, second = (seat.win_rate(table) for seat in seats)
+                else:
+                    first = win_rate_batch(table, baseline, n_games, seed, rules=rules)
+                    second = 1 - win_rate_batch(baseline, table, n_games, seed, rules=rules)
+                evaluated[key] = (first + second) / 2
+            rates[(threshold, num_rolls)] = evaluated[key]
+    return rates
+
+
+def ranked(rates):
+    """Return a list of ((THRESHOLD, NUM_ROLLS), WIN_RATE) pairs from the
+    dictionary RATES returned by sweep, best first.
+
+    >>> ranked({(8, 4): 0.5, (8, 6): 0.75, (10, 4): 0.25})
+    [((8, 6), 0.75), ((8, 4), 0.5), ((10, 4), 0.25)]
+    """
+    return sorted(rates.items(), key=lambda item: item[1], reverse=True)
+
+
+def surface(rates, thresholds, num_rolls_values):
+    """Return the win rates in RATES as a list of rows, one for each of
+    THRESHOLDS, with one column for each of NUM_ROLLS_VALUES.
+
+    >>> surface({(8, 4): 0.5, (8, 6): 0.75, (10, 4): 0.25, (10, 6): 1.0}, [8, 10], [4, 6])
+    [[0.5, 0.75], [0.25, 1.0]]
+    """
+    return [[rates[(threshold, num_rolls)] for num_rolls in num_rolls_values]
+            for threshold in thresholds]
+
+
+def report(rates, thresholds, num_rolls_values, top=10):
+    """Return a printable report of the TOP parameters in RATES, followed by
+    the whole surface of win rates.
+
+    >>> print(report({(8, 4): 0.5, (8, 6): 0.75}, [8], [4, 6], top=1))
+    Rank  threshold  num_rolls  win rate
+       1          8          6    0.7500
+    <BLANKLINE>
+    threshold \\ num_rolls       4       6
+                        8  0.5000  0.7500
+    """
+    lines = ['Rank  threshold  num_rolls  win rate']
+    for rank, ((threshold, num_rolls), rate) in enumerate(ranked(rates)[:top], 1):
+        lines.append('{:4}  {:9}  {:9}  {:8.4f}'.format(rank, threshold, num_rolls, rate))
+    lines.append('')
+    lines.append('threshold \\ num_rolls' + ''.join('{:8}'.format(n) for n in num_rolls_values))
+    for threshold, row in zip(thresholds, surface(rates, thresholds, num_rolls_values)):
+        lines.append('{:21}'.format(threshold) + ''.join('{:8.4f}'.format(r) for r in row))
+    return '\n'.join(lines)
+
+
+@main
+def run(*args):
+    """Sweep the parameters of a strategy and print the ranked report."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Hog strategy parameter sweep")
+    parser.add_argument('--strategy', '-s', choices=sorted(STRATEGIES),
+                        default='hefty_hogs_strategy', help='Strategy to sweep')
+    parser.add_argument('--thresholds', '-t', type=int, nargs='+',
+                        default=list(range(4, 13)), help='Thresholds to try')
+    parser.add_argument('--num_rolls', '-n', type=int, nargs='+',
+                        default=list(range(3, 9)), help='Numbers of dice to try')
+    parser.add_argument('--method', '-m', choices=['exact', 'batch'], default='exact',
+                        help='Compute win rates exactly or by simulation')
+    parser.add_argument('--games', '-g', type=int, default=100000,
+                        help='Games simulated per seat with --method batch')
+    parser.add_argument('--json', '-j', help='File to save the win-rate surface to')
+    args = parser.parse_args()
+
+    rates = sweep(STRATEGIES[args.strategy], args.thresholds, args.num_rolls,
+                  method=args.method, n_games=args.games)
+    print(report(rates, args.thresholds, args.num_rolls))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'strategy': args.strategy, 'thresholds': args.thresholds,
+                       'num_rolls': args.num_rolls,
+                       'surface': surface(rates, args.thresholds, args.num_rolls)}, f)
@@ -0,0 +1,164 @@
+"""Round-robin tournaments between Hog strategies.
+
+Every pair of strategies is compared exactly with hog_exact.compare_strategies,
+in parallel across processes. Results are cached on disk, keyed by a hash of
+each compiled strategy table, so adding a strategy to a tournament only
+computes the games that involve it.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import hog
+from hog_exact import compare_strategies
+from ucb import main
+
+CACHE_FILE = 'tournament_cache.json'
+
+
+def strategy_key(table):
+    """Return a hex digest that identifies the StrategyTable TABLE.
+
+    >>> strategy_key(hog.compile_strategy(hog.always_roll(4), 10))[:12]
+    '1011bce43900'
+    """
+    digest = hashlib.sha256(str(table.goal).encode())
+    digest.update(table.rolls_array().tobytes())
+    return digest.hexdigest()
+
+
+def default_strategies():
+    """Return a dictionary of named strategies: always_roll(n) for every n,
+    hefty_hogs_strategy and hog_pile_strategy over a grid of thresholds and
+    numbers of dice, and final_strategy.
+    """
+    strategies = {}
+    for n in range(11):
+        strategies['always_roll({})'.format(n)] = hog.always_roll(n)
+    for threshold in range(4, 13, 2):
+        for num_rolls in range(3, 8):
+            for strategy in (hog.hefty_hogs_strategy, hog.hog_pile_strategy):
+                name = '{}({}, {})'.format(strategy.__name__, threshold, num_rolls)
+                strategies[name] = _with_parameters(strategy, threshold, num_rolls)
+    strategies['final_strategy'] = hog.final_strategy
+    return strategies
+
+
+def _with_parameters(strategy, threshold, num_rolls):
+    def parameterized(score, opponent_score):
+        return strategy(score, opponent_score, threshold, num_rolls)
+    return parameterized
+
+
+def run_tournament(strategies, goal=hog.GOAL_SCORE, cache_dir='.', workers=None):
+    """Return (NAMES, MATRIX) for the dictionary STRATEGIES of named
+    strategies, where MATRIX[i][j] is the average win rate of NAMES[i] against
+    NAMES[j] over both seat orders.
+
+    Win probabilities already stored in the cache file in CACHE_DIR are reused;
+    the rest are computed with up to WORKERS processes and added to the cache.
+
+    Adding a strategy only computes the games that involve it: the four games
+    between two strategies are reused, and five new ones are played.
+
+    >>> strategies = {'roll(4)': hog.always_roll(4), 'roll(6)': hog.always_roll(6)}
+    >>> with tempfile.TemporaryDirectory() as cache_dir:
+    ...     names, matrix = run_tournament(strategies, 20, cache_dir, workers=1)
+    ...     cache_path = os.path.join(cache_dir, CACHE_FILE)
+    ...     old_cache = {pair: 0.25 for pair in load_cache(cache_path)}
+    ...     save_cache(cache_path, old_cache)
+    ...     strategies['roll(5)'] = hog.always_roll(5)
+    ...     names, matrix = run_tournament(strategies, 20, cache_dir, workers=1)
+    ...     new_cache = load_cache(cache_path)
+    >>> len(old_cache), len(new_cache)
+    (4, 9)
+    >>> all(new_cache[pair] == 0.25 for pair in old_cache)
+    True
+    >>> matrix[0][1]
+    0.5
+    """
+    names = list(strategies)
+    tables = [hog.compile_strategy(strategies[name], goal) for name in names]
+    keys = [strategy_key(table) for table in tables]
+    cache_path = os.path.join(cache_dir, CACHE_FILE)
+    cache = load_cache(cache_path)
+
+    missing = {}
+    for i, key0 in enumerate(keys):
+        for j, key1 in enumerate(keys):
+            pair = key0 + ':' + key1
+            if pair not in cache and pair not in missing:
+                missing[pair] = (tables[i], tables[j], goal)
+    if missing:
+        with ProcessPoolExecutor(workers) as executor:
+            results = executor.map(_compare_pair, missing.values())
+            cache.update(zip(missing, results))
+        save_cache(cache_path, cache)
+
+    matrix = []
+    for key0 in keys:
+        row = []
+        for key1 in keys:
+            first = cache[key0 + ':' + key1]
+            second = 1 - cache[key1 + ':' + key0]
+            row.append((first + second) / 2)
+        matrix.append(row)
+    return names, matrix
+
+
+def _compare_pair(args):
+    table0, table1, goal = args
+    return compare_strategies(table0, table1, goal)
+
+
+def load_cache(path):
+    """Return the dictionary of win probabilities stored at PATH, keyed by
+    'KEY0:KEY1' for a game between the tables with those keys."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_cache(path, cache):
+    """Atomically write the dictionary CACHE of win probabilities to PATH."""
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp',
+                                     delete=False) as f:
+        json.dump(cache, f)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.remove(f.name)
+        raise
+
+
+def ranking(names, matrix):
+    """Return a list of (NAME, MEAN_WIN_RATE) pairs, best first, where
+    MEAN_WIN_RATE is the average of NAME's row of MATRIX.
+
+    >>> ranking(['a', 'b'], [[0.5, 0.25], [0.75, 0.5]])
+    [('b', 0.625), ('a', 0.375)]
+    """
+    means = [(name, sum(row) / len(row)) for name, row in zip(names, matrix)]
+    return sorted(means, key=lambda pair: pair[1], reverse=True)
+
+
+@main
+def run(*args):
+    """Run a tournament between the default strategies and print the ranking."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Hog strategy tournament")
+    parser.add_argument('--cache_dir', '-c', default='.',
+                        help='Directory that holds the results cache')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='Number of worker processes')
+    args = parser.parse_args()
+
+    names, matrix = run_tournament(default_strategies(), cache_dir=args.cache_dir,
+                                   workers=args.workers)
+    for name, rate in ranking(names, matrix):
+        print('{:40} {:.4f}'.format(name, rate))
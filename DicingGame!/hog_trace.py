@@ -0,0 +1,279 @@
+"""Compact, columnar traces of Hog games.
+
+A GameTrace records the same information as the list of dictionaries built by
+trace_play in tests/play_utils.py, but keeps each field in a flat array:
+
+ -  S0_START, S1_START: the scores at the start of each turn.
+ -  WHO, NUM_DICE: the player taking each turn and the number of dice rolled.
+ -  DICE_OFFSETS: turn K rolled DICE_VALUES[DICE_OFFSETS[K]:DICE_OFFSETS[K + 1]].
+
+Traces can be written to a compact binary format and read back without
+copying, from bytes or from a memory-mapped file, so that large logs of games
+can be scanned without building a Python object for every turn. Indexing a
+trace returns a TurnView that reads its fields from the arrays on demand.
+
+The binary format of one trace is a header of four little-endian 32-bit
+fields (magic, version, number of turns, number of dice rolled), followed by
+the int32 columns S0_START, S1_START and DICE_OFFSETS and then the uint8
+columns WHO, NUM_DICE and DICE_VALUES, padded to a multiple of 4 bytes.
+Any number of traces can be stored back to back in one file.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = 0x54474f48  # b'HOGT' in little-endian order
+VERSION = 1
+HEADER = struct.Struct('<IIII')
+KEYS = ('s0_start', 's1_start', 'who', 'num_dice', 'dice_values')
+
+
+class GameTrace:
+    """The turns of one game of Hog, stored column by column.
+
+    >>> trace = GameTrace()
+    >>> trace.start_turn(0, 0, 0, 2)
+    >>> trace.add_roll(4)
+    >>> trace.add_roll(5)
+    >>> trace.start_turn(9, 0, 1, 1)
+    >>> trace.add_roll(1)
+    >>> len(trace), trace.num_rolls()
+    (2, 3)
+    >>> trace[0]
+    TurnView(s0_start=0, s1_start=0, who=0, num_dice=2, dice_values=[4, 5])
+    >>> trace[-1]['dice_values'], trace[-1].s0_start
+    ([1], 9)
+    >>> loaded = GameTrace.from_bytes(trace.to_bytes())
+    >>> loaded == trace, loaded.to_bytes() == trace.to_bytes()
+    (True, True)
+    """
+
+    def __init__(self):
+        self.s0_start = array('i')
+        self.s1_start = array('i')
+        self.who = array('B')
+        self.num_dice = array('B')
+        self.dice_offsets = array('i', [0])
+        self.dice_values = array('B')
+        self.readonly = False
+
+    def start_turn(self, s0_start, s1_start, who, num_dice):
+        """Record the start of a turn in which player WHO rolls NUM_DICE."""
+        assert not self.readonly, 'Cannot add turns to a loaded trace.'
+        self.s0_start.append(s0_start)
+        self.s1_start.append(s1_start)
+        self.who.append(who)
+        self.num_dice.append(num_dice)
+        self.dice_offsets.append(self.dice_offsets[-1])
+
+    def add_roll(self, value):
+        """Record a roll of the dice with outcome VALUE in the current turn."""
+        assert not self.readonly, 'Cannot add rolls to a loaded trace.'
+        assert len(self.s0_start) > 0, 'roll_dice called before either strategy function'
+        self.dice_values.append(value)
+        self.dice_offsets[-1] += 1
+
+    def __len__(self):
+        return len(self.s0_start)
+
+    def num_rolls(self):
+        """Return the total number of dice rolled in the game."""
+        return self.dice_offsets[len(self)]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('turn index out of range')
+        return TurnView(self, index)
+
+    def __eq__(self, other):
+        if not isinstance(other, GameTrace):
+            return NotImplemented
+        return all(list(self.column(key)) == list(other.column(key))
+                   for key in KEYS + ('dice_offsets',))
+
+    def column(self, key):
+        """Return the column named KEY, without copying it."""
+        return getattr(self, key)
+
+    def to_list(self):
+        """Return the trace as a list of dictionaries, like trace_play in
+        tests/play_utils.py."""
+        return [turn.to_dict() for turn in self]
+
+    def to_bytes(self):
+        """Return the trace in the binary format described in the module."""
+        parts = [HEADER.pack(MAGIC, VERSION, len(self), self.num_rolls())]
+        for column in self._columns():
+            if isinstance(column, memoryview):
+                column = array(column.format, column)
+            else:
+                column = array(column.typecode, column)
+            if sys.byteorder == 'big':
+                column.byteswap()
+            parts.append(column.tobytes())
+        data = b''.join(parts)
+        return data + bytes(-len(data) % 4)
+
+    def _columns(self):
+        return (self.s0_start, self.s1_start, self.dice_offsets,
+                self.who, self.num_dice, self.dice_values)
+
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        """Return the trace stored in DATA at OFFSET, a bytes-like object. The
+        columns of the trace are views of DATA, not copies, unless the
+        machine's byte order requires converting them.
+        """
+        return cls._read(memoryview(data), offset)[0]
+
+    @classmethod
+    def _read(cls, data, offset):
+        """Return (TRACE, END), the trace stored in DATA at OFFSET and the
+        offset of the byte that follows it."""
+        magic, version, turns, rolls = HEADER.unpack_from(data, offset)
+        assert magic == MAGIC, 'Not a Hog game trace.'
+        assert version == VERSION, 'Unsupported trace version {}.'.format(version)
+        trace = cls()
+        trace.readonly = True
+        offset += HEADER.size
+        columns = []
+        for typecode, length in (('i', turns), ('i', turns), ('i', turns + 1),
+                                 ('B', turns), ('B', turns), ('B', rolls)):
+            size = length * array(typecode).itemsize
+            column = data[offset:offset + size].cast(typecode)
+            if sys.byteorder == 'big' and typecode != 'B':
+                column = array(typecode, column.tobytes())
+                column.byteswap()
+            columns.append(column)
+            offset += size
+        (trace.s0_start, trace.s1_start, trace.dice_offsets,
+         trace.who, trace.num_dice, trace.dice_values) = columns
+        return trace, offset + (-offset % 4)
+
+
+class TurnView:
+    """A read-only view of turn INDEX of a GameTrace. Its fields can be read as
+    attributes or with the keys of the dictionaries built by trace_play."""
+
+    __slots__ = ('trace', 'index')
+
+    def __init__(self, trace, index):
+        self.trace = trace
+        self.index = index
+
+    @property
+    def s0_start(self):
+        return self.trace.s0_start[self.index]
+
+    @property
+    def s1_start(self):
+        return self.trace.s1_start[self.index]
+
+    @property
+    def who(self):
+        return self.trace.who[self.index]
+
+    @property
+    def num_dice(self):
+        return self.trace.num_dice[self.index]
+
+    @property
+    def dice_values(self):
+        offsets = self.trace.dice_offsets
+        return list(self.trace.dice_values[offsets[self.index]:offsets[self.index + 1]])
+
+    def __getitem__(self, key):
+        if key not in KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self):
+        return {key: self[key] for key in KEYS}
+
+    def __repr__(self):
+        fields = ', '.join('{}={!r}'.format(key, self[key]) for key in KEYS)
+        return 'TurnView({})'.format(fields)
+
+
+def write_traces(path, traces):
+    """Write each of TRACES to the file at PATH, back to back."""
+    with open(path, 'wb') as f:
+        for trace in traces:
+            f.write(trace.to_bytes())
+
+
+def read_traces(path):
+    """Yield each GameTrace stored in the file at PATH. The file is
+    memory-mapped, so the traces read their columns directly from the file,
+    which must stay open until they are no longer used.
+
+    >>> import os, tempfile
+    >>> first, second = GameTrace(), GameTrace()
+    >>> first.start_turn(0, 0, 0, 0)
+    >>> second.start_turn(3, 7, 1, 1)
+    >>> second.add_roll(6)
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'games.trace')
+    ...     write_traces(path, [first, second])
+    ...     [trace.to_list() for trace in read_traces(path)]
+    [[{'s0_start': 0, 's1_start': 0, 'who': 0, 'num_dice': 0, 'dice_values': []}], [{'s0_start': 3, 's1_start': 7, 'who': 1, 'num_dice': 1, 'dice_values': [6]}]]
+    """
+    with open(path, 'rb') as f:
+        if not f.seek(0, 2):
+            return
+        data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    offset = 0
+    while offset < len(data):
+        trace, offset = GameTrace._read(data, offset)
+        yield trace
+
+
+def trace_play(play, strategy0, strategy1, score0, score1, dice, goal, say):
+    """Play a game like trace_play in tests/play_utils.py, which calls each
+    strategy once per turn, and return (S0, S1, TRACE), the final scores and a
+    GameTrace of the game.
+
+    >>> import hog, io
+    >>> from contextlib import redirect_stdout
+    >>> from dice import make_test_dice
+    >>> with redirect_stdout(io.StringIO()):
+    ...     s0, s1, trace = trace_play(hog.play, hog.always_roll(3), hog.always_roll(1),
+    ...                                0, 0, make_test_dice(4, 6, 5), 20, hog.silence)
+    >>> s0, s1, len(trace)
+    (30, 4, 3)
+    >>> [turn.dice_values for turn in trace]
+    [[4, 6, 5], [4], [6, 5, 4]]
+    """
+    trace = GameTrace()
+
+    def mod_strategy(who, my_score, opponent_score):
+        if len(trace):
+            last = trace[-1]
+            if last.s0_start + last.s1_start == my_score + opponent_score:
+                # game is still on last turn since the total number of points
+                # goes up every turn
+                return last.num_dice
+        current_num_dice = (strategy0, strategy1)[who](my_score, opponent_score)
+        scores = [my_score, opponent_score]
+        trace.start_turn(scores[who], scores[1 - who], who, current_num_dice)
+        return current_num_dice
+
+    def mod_dice():
+        roll = dice()
+        trace.add_roll(roll)
+        return roll
+
+    s0, s1 = play(
+        lambda a, b: mod_strategy(0, a, b),
+        lambda a, b: mod_strategy(1, a, b),
+        score0,
+        score1,
+        dice=mod_dice,
+        goal=goal,
+        say=say,
+    )
+    return s0, s1, trace
@@ -1,4 +1,13 @@
-from hog import GOAL_SCORE
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from hog import GOAL_SCORE, StrategyTable
+
+PARALLEL_GOAL = 300  # Smaller grids are quicker to compute in one process.
+MAX_REPORTED = 10  # Most invalid cells listed in an error message
+
+_grid_strategy = None  # Set only in worker processes by _init_grid_worker
 
 def check_strategy_roll(score, opponent_score, num_rolls):
     """Raises an error with a helpful message if NUM_ROLLS is an invalid
@@ -52,4 +61,90 @@ def check_strategy(strategy, goal=GOAL_SCORE):
     for score in range(goal):
         for opponent_score in range(goal):
             num_rolls = strategy(score, opponent_score)
-            check_strategy_roll(score, opponent_score, num_rolls)
\ No newline at end of file
+            check_strategy_roll(score, opponent_score, num_rolls)
+
+
+def strategy_grid(strategy, goal=GOAL_SCORE, workers=None):
+    """Return a list of STRATEGY(score, opponent_score) for every pair of
+    scores below GOAL, in order of score and then opponent_score. For goals of
+    at least PARALLEL_GOAL, the rows are computed by WORKERS forked processes
+    (by default, one per CPU).
+
+    >>> strategy_grid(lambda score, opponent_score: score - opponent_score, 3)
+    [0, -1, -2, 1, 0, -1, 2, 1, 0]
+    """
+    if isinstance(strategy, StrategyTable) and strategy.goal == goal:
+        return list(strategy.rolls_array())
+    workers = workers or os.cpu_count() or 1
+    if goal < PARALLEL_GOAL or workers == 1 or \
+            'fork' not in multiprocessing.get_all_start_methods():
+        return [strategy(score, opponent_score)
+                for score in range(goal) for opponent_score in range(goal)]
+    chunk = -(-goal // (4 * workers))
+    starts = range(0, goal, chunk)
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(workers, mp_context=context,
+                             initializer=_init_grid_worker,
+                             initargs=(strategy,)) as executor:
+        rows = executor.map(_grid_rows, starts,
+                            [min(start + chunk, goal) for start in starts],
+                            [goal] * len(starts))
+        return [num_rolls for part in rows for num_rolls in part]
+
+
+def _init_grid_worker(strategy):
+    global _grid_strategy
+    _grid_strategy = strategy
+
+
+def _grid_rows(start, end, goal):
+    return [_grid_strategy(score, opponent_score)
+            for score in range(start, end) for opponent_score in range(goal)]
+
+
+def invalid_rolls(strategy, goal=GOAL_SCORE, workers=None):
+    """Return a list of (SCORE, OPPONENT_SCORE, NUM_ROLLS) for every pair of
+    scores below GOAL for which STRATEGY returns an invalid NUM_ROLLS.
+
+    The grid is computed once by strategy_grid and then checked in one pass:
+    with NumPy when every output is an integer, or by type otherwise.
+
+    >>> def fail_high(score, opponent_score):
+    ...     return 11 if score + opponent_score > 5 else 0
+    >>> invalid_rolls(fail_high, 4)
+    [(3, 3, 11)]
+    """
+    outputs = strategy_grid(strategy, goal, workers)
+    if all(type(num_rolls) == int for num_rolls in outputs):
+        import numpy as np
+        rolls = np.fromiter(outputs, dtype=np.int64, count=len(outputs))
+        bad = np.flatnonzero((rolls < 0) | (rolls > 10)).tolist()
+    else:
+        bad = [i for i, num_rolls in enumerate(outputs)
+               if type(num_rolls) != int or not 0 <= num_rolls <= 10]
+    return [(i // goal, i % goal, outputs[i]) for i in bad]
+
+
+def check_strategy_grid(strategy, goal=GOAL_SCORE, workers=None):
+    """Checks the strategy with all valid inputs like check_strategy, but
+    reports every invalid output at once rather than only the first.
+
+    >>> def fail_diagonal(score, opponent_score):
+    ...     return None if score == opponent_score else 5
+    >>> check_strategy_grid(fail_diagonal, 3)
+    Traceback (most recent call last):
+     ...
+    AssertionError: 3 invalid outputs: strategy(0, 0) returned None (not an integer); strategy(1, 1) returned None (not an integer); strategy(2, 2) returned None (not an integer)
+    >>> check_strategy_grid(lambda score, opponent_score: 5, 1000)
+    """
+    bad = invalid_rolls(strategy, goal, workers)
+    if bad:
+        messages = []
+        for score, opponent_score, num_rolls in bad[:MAX_REPORTED]:
+            try:
+                check_strategy_roll(score, opponent_score, num_rolls)
+            except AssertionError as e:
+                messages.append(str(e))
+        if len(bad) > MAX_REPORTED:
+            messages.append('and {} more'.format(len(bad) - MAX_REPORTED))
+        raise AssertionError('{} invalid outputs: {}'.format(len(bad), '; '.join(messages)))
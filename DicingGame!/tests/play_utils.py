@@ -59,11 +59,22 @@ def safe(commentary):
         return leader, message
     return new_commentary
 
-def describe_game(hog, test_number, score0, score1, goal):
-    strat_seed0, strat_seed1, dice_seed = run_with_seed(test_number, lambda: [random.randrange(2**32) for _ in range(3)])
-    strategy0 = random_strat(strat_seed0)
-    strategy1 = random_strat(strat_seed1)
-    dice = get_dice(dice_seed)
+def describe_game(hog, test_number, score0, score1, goal, counter_based=False):
+    """Describe a game played with random strategies and dice derived from
+    TEST_NUMBER. With COUNTER_BASED, the strategies and dice come from the
+    counter-based generator below, which is much faster and shares no state,
+    but produces different games from the default.
+    """
+    if counter_based:
+        strat_seed0, strat_seed1, dice_seed = [splitmix64(test_number, i) for i in range(3)]
+        strategy0 = counter_strat(strat_seed0)
+        strategy1 = counter_strat(strat_seed1)
+        dice = counter_dice(dice_seed)
+    else:
+        strat_seed0, strat_seed1, dice_seed = run_with_seed(test_number, lambda: [random.randrange(2**32) for _ in range(3)])
+        strategy0 = random_strat(strat_seed0)
+        strategy1 = random_strat(strat_seed1)
+        dice = get_dice(dice_seed)
     s0last, s1last, game_trace = trace_play(
         hog.play,
         strategy0,
@@ -114,4 +125,58 @@ def get_dice(seed):
         nonlocal seed
         seed, value = run_with_seed(seed, lambda: (random.randrange(0, 2**32), random.randrange(1, 7)))
         return value
-    return dice
\ No newline at end of file
+    return dice
+
+# A counter-based generator: the Nth value for a KEY is a hash of (KEY, N), so
+# values can be computed in any order, in parallel, without any saved state.
+
+MASK64 = 2 ** 64 - 1
+
+
+def splitmix64(key, counter):
+    """Return a pseudorandom 64-bit integer determined by KEY and COUNTER,
+    using the output function of the SplitMix64 generator.
+
+    >>> splitmix64(0, 0) == splitmix64(0, 0) != splitmix64(0, 1)
+    True
+    """
+    z = (key + (counter + 1) * 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+def counter_randrange(key, counter, n):
+    """Return a number from 0 to N - 1 determined by KEY and COUNTER."""
+    return splitmix64(key, counter) % n
+
+def counter_strat(seed):
+    """
+    Makes a random strategy like random_strat, without using the random module
+
+    >>> strategy = counter_strat(61)
+    >>> [strategy(s, 7) for s in range(8)] == [counter_strat(61)(s, 7) for s in range(8)]
+    True
+    """
+    def counter_strat(score, opponent_score):
+        return counter_randrange(seed, (score << 32) + opponent_score, 11)
+    return counter_strat
+
+def counter_dice(seed):
+    """
+    Makes six-sided dice like get_dice, without using the random module
+
+    >>> dice = counter_dice(61)
+    >>> rolls = [dice() for _ in range(1000)]
+    >>> same_dice = counter_dice(61)
+    >>> rolls == [same_dice() for _ in range(1000)]
+    True
+    >>> sorted(set(rolls))
+    [1, 2, 3, 4, 5, 6]
+    """
+    index = 0
+    def dice():
+        nonlocal index
+        value = counter_randrange(seed, index, 6) + 1
+        index += 1
+        return value
+    return dice
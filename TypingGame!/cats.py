@@ -59,11 +59,19 @@ def wpm(typed, elapsed):
     assert elapsed > 0, 'Elapsed time must be positive'
     return len(typed) / 5 * 60 / elapsed
 
-def autocorrect(typed_word, word_list, diff_function, limit):
+def autocorrect(typed_word, word_list, diff_function, limit, index=None):
     """Returns the element of WORD_LIST that has the smallest difference
     from TYPED_WORD. Instead returns TYPED_WORD if that difference is greater
     than LIMIT.
+
+    INDEX is an optional word_index.WordIndex of WORD_LIST, such as a BKTree
+    or DeletionIndex. If it is given, only the words it finds close to
+    TYPED_WORD are compared, which gives the same result for any
+    DIFF_FUNCTION that is never less than the edit distance, such as
+    sphinx_swaps and minimum_mewtations.
     """
+    if index is not None:
+        return index.closest(typed_word, diff_function, limit)
     if typed_word in word_list:
         return typed_word
     pairs = {word : diff_function(typed_word, word, limit) for word in word_list}
@@ -3,8 +3,10 @@ import base64
 import os
 import random
 import string
+import threading
 
 import cats
+import word_index
 from gui_files.common_server import Server, route, sendto, start
 from multiplayer import multiplayer
 
@@ -16,6 +18,28 @@ WORDS_LIST = cats.lines_from_file("data/words.txt")
 WORDS_SET = set(WORDS_LIST)
 LETTER_SETS = [(w, set(w)) for w in WORDS_LIST]
 SIMILARITY_LIMIT = 2
+WORDS_INDEX = None  # A word_index.WordIndex of WORDS_LIST, once it is built
+# Diff functions never less than the edit distance, which WORDS_INDEX can serve
+INDEXED_DIFFS = (cats.minimum_mewtations, cats.sphinx_swaps)
+
+
+def build_words_index(index_dir=None):
+    """Build the index used by autocorrect. Until it is built, autocorrect
+    compares the similar_words of the typed word instead.
+
+    With an INDEX_DIR, the DeletionIndex saved there by word_index.py is
+    loaded, or built and saved there if there is none. Otherwise, a BKTree
+    is built.
+    """
+    global WORDS_INDEX
+    if index_dir:
+        index = word_index.load_deletion_index(index_dir, WORDS_LIST, SIMILARITY_LIMIT)
+        if index is None:
+            index = word_index.build_deletion_index(WORDS_LIST, SIMILARITY_LIMIT)
+            word_index.save_deletion_index(index_dir, index)
+    else:
+        index = word_index.BKTree(WORDS_LIST)
+    WORDS_INDEX = index
 
 
 @route
@@ -42,6 +66,12 @@ def similar(w, v, n):
     return intersect >= len(w) - n and intersect >= len(v) - n
 
 
+def similar_words(word):
+    """Heuristically choose candidate words to score."""
+    letters = set(word)
+    return [w for w, s in LETTER_SETS if similar(s, letters, SIMILARITY_LIMIT)]
+
+
 @route
 def autocorrect(word=""):
     """Call autocorrect using the best score function available."""
@@ -50,14 +80,15 @@ def autocorrect(word=""):
     if word in WORDS_SET or word == "":
         return raw_word
 
-    # Heuristically choose candidate words to score.
-    letters = set(word)
-    candidates = [w for w, s in LETTER_SETS if similar(s, letters, SIMILARITY_LIMIT)]
-
     # Try various diff functions until one doesn't raise an exception.
     for fn in [cats.final_diff, cats.minimum_mewtations, cats.sphinx_swaps]:
         try:
-            guess = cats.autocorrect(word, candidates, fn, SIMILARITY_LIMIT)
+            fn(word, word, SIMILARITY_LIMIT)  # Skip unimplemented functions early.
+            if WORDS_INDEX is not None and fn in INDEXED_DIFFS:
+                guess = cats.autocorrect(word, WORDS_LIST, fn, SIMILARITY_LIMIT,
+                                         WORDS_INDEX)
+            else:
+                guess = cats.autocorrect(word, similar_words(word), fn, SIMILARITY_LIMIT)
             return reformat(guess, raw_word)
         except BaseException:
             pass
@@ -139,4 +170,6 @@ def favicon():
 
 
 if __name__ == "__main__" or os.environ.get("ENV") == "prod":
+    threading.Thread(target=build_words_index, args=(os.environ.get("CATS_INDEX_DIR"),),
+                     daemon=True).start()
     app = start(PORT, DEFAULT_SERVER, GUI_FOLDER, multiplayer.db_init)
@@ -0,0 +1,427 @@
+"""Indexes of words for finding the words close to a typed word quickly.
+
+Two indexes hold a list of words, such as the words in data/words.txt, and
+find the words within some edit distance of a typed word without comparing it
+to every word in the list:
+
+A BKTree arranges the words by their edit distance from each other, and only
+compares the typed word to a small part of the tree.
+
+A DeletionIndex holds every string made by deleting a few letters from the
+start of each word. Two words within edit distance D of each other share such
+a string, so the candidates for a typed word are found with a few lookups and
+then checked. It is built once, saved with save_deletion_index, and loaded
+with load_deletion_index, which maps the saved arrays into memory.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from ucb import main
+from utils import lines_from_file
+
+WORDS_PATH = "data/words.txt"
+MAX_DELETIONS = 2  # Most edits between a typed word and the words it finds
+DELETION_PREFIX = 7  # Letters at the start of each word whose deletions are kept
+
+
+def edit_distance(start, goal):
+    """Return the number of single-letter additions, removals and
+    substitutions needed to turn START into GOAL.
+
+    >>> edit_distance("cats", "scat")
+    2
+    >>> edit_distance("purng", "purring")
+    2
+    >>> edit_distance("", "hello"), edit_distance("same", "same")
+    (5, 0)
+    """
+    return _bit_distance(start, _letter_masks(start), goal)
+
+
+def _letter_masks(word):
+    """Return a dictionary from each letter of WORD to a number whose binary
+    digits mark the positions of that letter in WORD."""
+    masks, bit = {}, 1
+    for letter in word:
+        masks[letter] = masks.get(letter, 0) | bit
+        bit <<= 1
+    return masks
+
+
+def _bit_distance(start, masks, goal):
+    """Return the edit distance from START, whose _letter_masks are MASKS, to
+    GOAL, computing each column of the edit distance table at once as the
+    binary digits of a few numbers (Myers' bit-vector algorithm)."""
+    m = len(start)
+    if m == 0:
+        return len(goal)
+    all_ones, high = (1 << m) - 1, 1 << (m - 1)
+    plus, minus, distance = all_ones, 0, m  # Vertical differences of +1 and -1
+    for letter in goal:
+        equal = masks.get(letter, 0)
+        x_vertical = equal | minus
+        x_horizontal = (((equal & plus) + plus) ^ plus) | equal
+        plus_horizontal = minus | ~(x_horizontal | plus)
+        minus_horizontal = plus & x_horizontal
+        if plus_horizontal & high:
+            distance += 1
+        elif minus_horizontal & high:
+            distance -= 1
+        plus_horizontal = (plus_horizontal << 1) | 1
+        minus_horizontal <<= 1
+        plus = (minus_horizontal | ~(x_vertical | plus_horizontal)) & all_ones
+        minus = plus_horizontal & x_vertical & all_ones
+    return distance
+
+
+class WordIndex:
+    """An index of words, which subclasses search by edit distance."""
+
+    def __contains__(self, word):
+        matches, _ = self.search(word, 0)
+        return bool(matches)
+
+    def search(self, word, limit):
+        """Return a list of (DISTANCE, W) pairs for the words W within edit
+        distance LIMIT of WORD, in order of their ranks, and the number of
+        words compared with WORD to find them."""
+        raise NotImplementedError
+
+    def within(self, word, limit):
+        """Return a list of the words within edit distance LIMIT of WORD, in
+        order of their ranks."""
+        return [match for _, match in self.search(word, limit)[0]]
+
+    def closest(self, word, diff_function, limit):
+        """Return the word in the index with the smallest difference from WORD
+        under DIFF_FUNCTION, the first by rank among ties, or WORD itself if
+        that difference is greater than LIMIT, like cats.autocorrect.
+
+        DIFF_FUNCTION must never be less than the edit distance. Words are
+        searched one edit distance at a time, and words farther than the
+        smallest difference found so far are never compared, since they
+        cannot have a smaller difference.
+
+        >>> index = BKTree(["cat", "hat", "cart", "dog", "cats", "scat"])
+        >>> from cats import minimum_mewtations, sphinx_swaps
+        >>> index.closest("cst", minimum_mewtations, 2)
+        'cat'
+        >>> index.closest("dogs", sphinx_swaps, 2), index.closest("zzzzzz", sphinx_swaps, 2)
+        ('dog', 'zzzzzz')
+        """
+        if word in self:
+            return word
+        diffs, matches = {}, []
+        for distance in range(1, limit + 1):
+            matches = self.search(word, distance)[0]
+            for match_distance, match in matches:
+                if match_distance == distance:
+                    diffs[match] = diff_function(word, match, limit)
+            if diffs and min(diffs.values()) <= distance:
+                break
+        if not diffs or min(diffs.values()) > limit:
+            return word
+        return min((match for _, match in matches), key=lambda match: diffs[match])
+
+
+class BKTree(WordIndex):
+    """A Burkhard-Keller tree of WORDS under edit distance.
+
+    Each node is a word, and its children are kept by their edit distance
+    from it. By the triangle inequality, the words within LIMIT of a typed
+    word that is D away from a node are only found below the node's children
+    at distances from D - LIMIT to D + LIMIT, so the rest are never visited.
+
+    >>> tree = BKTree(["cat", "hat", "cart", "dog", "cats", "scat"])
+    >>> len(tree), "dog" in tree, "dot" in tree
+    (6, True, False)
+    >>> tree.within("cst", 1)
+    ['cat']
+    >>> tree.within("cst", 2)
+    ['cat', 'hat', 'cart', 'cats', 'scat']
+    >>> tree.within("hog", 1), tree.within("zzzzzz", 2)
+    (['dog'], [])
+    """
+
+    def __init__(self, words):
+        self.root = None
+        self.size = 0
+        for rank, word in enumerate(words):
+            self.add(word, rank)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, word, rank=None):
+        """Add WORD, ordered by RANK among the words found by a search (by
+        default, after every word already added). A word already in the tree
+        keeps its first rank."""
+        node = [word, self.size if rank is None else rank, {}]
+        if self.root is None:
+            self.root, self.size = node, 1
+            return
+        masks, current = _letter_masks(word), self.root
+        while True:
+            distance = _bit_distance(word, masks, current[0])
+            if distance == 0:
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                self.size += 1
+                return
+            current = child
+
+    def search(self, word, limit):
+        """Return a list of (DISTANCE, W) pairs for the words W within edit
+        distance LIMIT of WORD, in order of their ranks, and the number of
+        nodes visited to find them.
+
+        >>> tree = BKTree(lines_from_file("data/words.txt"))
+        >>> matches, visited = tree.search("speling", 1)
+        >>> matches
+        [(1, 'spelling'), (1, 'apeling'), (1, 'spelding'), (1, 'sperling'), (1, 'spewing'), (1, 'spiling')]
+        >>> visited < len(tree) // 20
+        True
+        """
+        if self.root is None:
+            return [], 0
+        masks, found, visited = _letter_masks(word), [], 0
+        stack = [self.root]
+        while stack:
+            current, rank, children = stack.pop()
+            visited += 1
+            distance = _bit_distance(word, masks, current)
+            if distance <= limit:
+                found.append((rank, distance, current))
+            for child_distance in range(max(1, distance - limit), distance + limit + 1):
+                child = children.get(child_distance)
+                if child is not None:
+                    stack.append(child)
+        return [(distance, match) for _, distance, match in sorted(found)], visited
+
+
+###################
+# Deletion Index #
+###################
+
+# A DeletionIndex is stored as three arrays that share a name derived from its
+# words and limits: the sorted, distinct 64-bit keys of the deletions in
+# NAME.keys.npy, the ranks of the words with each deletion in NAME.ranks.npy,
+# starting at the positions in NAME.starts.npy, and NAME.json, written last,
+# which describes them.
+
+def deletions(word, max_distance):
+    """Return the set of strings made by deleting at most MAX_DISTANCE
+    letters from WORD, including WORD itself.
+
+    >>> sorted(deletions("cat", 1))
+    ['at', 'ca', 'cat', 'ct']
+    >>> len(deletions("kitten", 2))
+    17
+    """
+    found = level = {word}
+    for _ in range(max_distance):
+        level = {w[:i] + w[i + 1:] for w in level for i in range(len(w))}
+        found = found | level
+    return found
+
+
+def _deletion_key(deletion):
+    """Return a 64-bit number for DELETION that is the same in every process."""
+    digest = hashlib.blake2b(deletion.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class DeletionIndex(WordIndex):
+    """The words of WORDS, found by the deletions of at most MAX_DISTANCE
+    letters from their first PREFIX_LENGTH letters.
+
+    KEYS are the distinct keys of those deletions in increasing order, and
+    the ranks in WORDS of the words with the deletion KEYS[i] are
+    RANKS[STARTS[i]:STARTS[i + 1]]. Use build_deletion_index to build one.
+
+    If two words are within edit distance D of each other, then so are their
+    first PREFIX_LENGTH letters, and deleting at most D letters from each of
+    those gives the same string. So every word within D of a typed word is
+    among the candidates that share a deletion with it, which are then
+    checked against the whole typed word.
+    """
+
+    def __init__(self, words, keys, starts, ranks, max_distance, prefix_length):
+        self.words = words
+        self.keys, self.starts, self.ranks = keys, starts, ranks
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+
+    def __len__(self):
+        return len(self.words)
+
+    def search(self, word, limit):
+        """Return a list of (DISTANCE, W) pairs for the words W within edit
+        distance LIMIT of WORD, in order of their ranks, and the number of
+        candidates checked to find them.
+
+        >>> index = build_deletion_index(["cat", "hat", "cart", "dog", "cats", "scat"])
+        >>> index.search("cst", 1)
+        ([(1, 'cat')], 4)
+        >>> index.within("cst", 2) == BKTree(index.words).within("cst", 2)
+        True
+        """
+        import numpy as np
+        assert limit <= self.max_distance, 'The index only holds {} deletions'.format(
+            self.max_distance)
+        queries = np.array(sorted(_deletion_key(deletion) for deletion in
+                                  deletions(word[:self.prefix_length], limit)),
+                           dtype=np.uint64)
+        if len(self.keys) == 0:
+            return [], 0
+        positions = np.minimum(np.searchsorted(self.keys, queries), len(self.keys) - 1)
+        positions = positions[self.keys[positions] == queries]
+        candidates = np.unique(np.concatenate(
+            [self.ranks[self.starts[i]:self.starts[i + 1]] for i in positions] or [[]]
+        ).astype(np.int64))
+        masks, found = _letter_masks(word), []
+        for rank in candidates.tolist():
+            distance = _bit_distance(word, masks, self.words[rank])
+            if distance <= limit:
+                found.append((distance, self.words[rank]))
+        return found, len(candidates)
+
+    def memory_report(self):
+        """Return a dictionary of the bytes taken by each part of the index.
+
+        >>> report = build_deletion_index(["cat", "hat"]).memory_report()
+        >>> sorted(report), report['keys']
+        (['keys', 'ranks', 'starts', 'total', 'words'], 88)
+        """
+        import sys
+        report = {
+            'keys': self.keys.nbytes,
+            'starts': self.starts.nbytes,
+            'ranks': self.ranks.nbytes,
+            'words': sys.getsizeof(self.words) + sum(map(sys.getsizeof, self.words)),
+        }
+        report['total'] = sum(report.values())
+        return report
+
+
+def build_deletion_index(words, max_distance=MAX_DELETIONS, prefix_length=DELETION_PREFIX):
+    """Return a DeletionIndex of the list WORDS that finds the words within
+    edit distance MAX_DISTANCE of a typed word. A word that appears more
+    than once is only found at its first rank."""
+    from array import array
+    import numpy as np
+    keys, ranks, seen = array('Q'), array('l'), set()
+    for rank, word in enumerate(words):
+        if word not in seen:
+            seen.add(word)
+            for deletion in deletions(word[:prefix_length], max_distance):
+                keys.append(_deletion_key(deletion))
+                ranks.append(rank)
+    keys = np.frombuffer(keys, dtype=np.uint64)
+    ranks = np.frombuffer(ranks, dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    keys, firsts = np.unique(keys[order], return_index=True)
+    starts = np.append(firsts, len(order)).astype(np.uint32)
+    return DeletionIndex(words, keys, starts, ranks[order].astype(np.uint32),
+                         max_distance, prefix_length)
+
+
+def deletion_index_name(words, max_distance=MAX_DELETIONS, prefix_length=DELETION_PREFIX):
+    """Return the name shared by the files of a DeletionIndex of WORDS.
+
+    >>> deletion_index_name(["cat"]) == deletion_index_name(["cat"], prefix_length=6)
+    False
+    """
+    digest = hashlib.sha256('\n'.join(words).encode()).hexdigest()
+    return 'deletions-{}-{}-{}'.format(max_distance, prefix_length, digest[:16])
+
+
+def save_deletion_index(index_dir, index):
+    """Atomically write the arrays of the DeletionIndex INDEX to INDEX_DIR.
+
+    >>> import tempfile
+    >>> words = ["cat", "hat", "cart", "dog", "cats", "scat"]
+    >>> with tempfile.TemporaryDirectory() as index_dir:
+    ...     save_deletion_index(index_dir, build_deletion_index(words))
+    ...     loaded = load_deletion_index(index_dir, words)
+    ...     found = loaded.within("cst", 2), type(loaded.keys).__name__
+    ...     missing = load_deletion_index(index_dir, words, max_distance=1)
+    >>> found, missing
+    ((['cat', 'hat', 'cart', 'cats', 'scat'], 'memmap'), None)
+    """
+    import numpy as np
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, deletion_index_name(index.words, index.max_distance,
+                                                       index.prefix_length))
+    for part in ('keys', 'starts', 'ranks'):
+        array = getattr(index, part)
+        _replace(path + '.' + part + '.npy', lambda f: np.save(f, np.asarray(array)))
+    info = {'words': len(index.words), 'max_distance': index.max_distance,
+            'prefix_length': index.prefix_length}
+    _replace(path + '.json', lambda f: f.write(json.dumps(info).encode()))
+
+
+def load_deletion_index(index_dir, words, max_distance=MAX_DELETIONS,
+                        prefix_length=DELETION_PREFIX):
+    """Return the DeletionIndex of WORDS stored in INDEX_DIR, with its arrays
+    memory-mapped read-only, or None if there is none."""
+    import numpy as np
+    path = os.path.join(index_dir, deletion_index_name(words, max_distance, prefix_length))
+    try:
+        with open(path + '.json') as f:
+            info = json.load(f)
+    except FileNotFoundError:
+        return None
+    keys, starts, ranks = (np.load(path + '.' + part + '.npy', mmap_mode='r')
+                           for part in ('keys', 'starts', 'ranks'))
+    return DeletionIndex(words, keys, starts, ranks, info['max_distance'],
+                         info['prefix_length'])
+
+
+def _replace(path, write):
+    """Replace the file at PATH with one written by calling WRITE on a new
+    binary file, so that readers never see a partly written file."""
+    with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(os.path.abspath(path)),
+                                     suffix='.tmp', delete=False) as f:
+        write(f)
+    try:
+        os.chmod(f.name, 0o644)  # Readable by every server that loads the index
+        os.replace(f.name, path)
+    except OSError:
+        os.remove(f.name)
+        raise
+
+
+@main
+def run(*args):
+    """Build the DeletionIndex of a word list, save it to a directory to be
+    loaded by setting CATS_INDEX_DIR, and report its size."""
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Build the autocorrect index")
+    parser.add_argument('index_dir', help='Directory that holds the index')
+    parser.add_argument('--words', '-w', default=WORDS_PATH, help='Word list to index')
+    parser.add_argument('--max_distance', '-d', type=int, default=MAX_DELETIONS,
+                        help='Most edits between a typed word and the words found')
+    parser.add_argument('--prefix_length', '-p', type=int, default=DELETION_PREFIX,
+                        help='Letters at the start of each word whose deletions are kept')
+    args = parser.parse_args()
+
+    words = lines_from_file(args.words)
+    start = time.perf_counter()
+    index = build_deletion_index(words, args.max_distance, args.prefix_length)
+    built = time.perf_counter()
+    save_deletion_index(args.index_dir, index)
+    start_load = time.perf_counter()
+    load_deletion_index(args.index_dir, words, args.max_distance, args.prefix_length)
+    loaded = time.perf_counter()
+    print('Built {} in {:.1f}s and loaded it in {:.3f}s'.format(
+        deletion_index_name(words, args.max_distance, args.prefix_length),
+        built - start, loaded - start_load))
+    for part, size in index.memory_report().items():
+        print('{:>8} {:>10.1f} MB'.format(part, size / 2 ** 20))